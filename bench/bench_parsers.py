@@ -0,0 +1,201 @@
+"""วัดความเร็ว parser ใน ios_parsers เทียบกับ parser แบบเดิม และตรวจว่าผลลัพธ์ตรงกัน
+
+รัน (จาก root ของ repo): python bench/bench_parsers.py [จำนวน interface] [จำนวนรอบ]
+ไฟล์นี้อยู่นอก build context ของ Docker จึงไม่ติดไปกับ image ของ worker
+"""
+
+import os
+import re
+import sys
+import timeit
+
+# ใช้ ios_parsers ของ worker (สำเนาใน web เหมือนกัน)
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "worker")
+)
+
+import ios_parsers  # noqa: E402
+
+
+def legacy_parse_dhcp_pools(raw_config):
+    """parser DHCP แบบเดิม (อ่านข้อมูลสองรอบ เรียก re.match ทุกบรรทัด) ใช้เป็นค่าอ้างอิง"""
+    if not raw_config:
+        return [], []
+
+    pools = {}
+    excluded_addresses = []
+    for line in raw_config.splitlines():
+        if line.startswith("ip dhcp excluded-address"):
+            parts = line.split()
+            if len(parts) >= 4:
+                excluded_addresses.append(
+                    f"{parts[3]} - {parts[4] if len(parts) > 4 else ''}"
+                )
+
+    current_pool = None
+    for line in raw_config.splitlines():
+        pool_match = re.match(r"^ip dhcp pool\s+(.+)", line)
+        if pool_match:
+            current_pool = pool_match.group(1).strip()
+            pools[current_pool] = {"name": current_pool}
+            continue
+
+        if current_pool and line.startswith(" "):
+            parts = line.strip().split()
+            if parts[0] == "network" and len(parts) >= 3:
+                pools[current_pool]["network"] = f"{parts[1]} / {parts[2]}"
+            elif parts[0] == "default-router" and len(parts) >= 2:
+                pools[current_pool]["default_router"] = parts[1]
+            elif parts[0] == "dns-server" and len(parts) >= 2:
+                pools[current_pool]["dns_servers"] = " ".join(parts[1:])
+
+    return list(pools.values()), excluded_addresses
+
+
+def legacy_parse_acls(acl_raw, interface_raw):
+    """parser ACL แบบเดิม (รู้จักแค่ standard ACL แบบตัวเลข) ใช้เป็นค่าอ้างอิง"""
+    if not acl_raw or not interface_raw:
+        return []
+
+    acls = {}
+    current_acl = None
+    for line in acl_raw.splitlines():
+        acl_match = re.search(r"Standard IP access list (\d+)", line)
+        if acl_match:
+            current_acl = acl_match.group(1)
+            acls[current_acl] = {"name": current_acl, "rules": [], "interfaces": []}
+            continue
+
+        if current_acl and line.startswith(" "):
+            acls[current_acl]["rules"].append(line.strip())
+
+    current_interface = None
+    for line in interface_raw.splitlines():
+        if "line protocol is" in line:
+            current_interface = line.split()[0]
+            continue
+
+        inbound_match = re.search(r"Inbound  access list is (.+)", line)
+        if current_interface and inbound_match:
+            acl_num = inbound_match.group(1).strip()
+            if acl_num in acls:
+                acls[acl_num]["interfaces"].append(f"{current_interface} (in)")
+
+        outbound_match = re.search(r"Outgoing access list is (.+)", line)
+        if current_interface and outbound_match:
+            acl_num = outbound_match.group(1).strip()
+            if acl_num in acls:
+                acls[acl_num]["interfaces"].append(f"{current_interface} (out)")
+
+    return list(acls.values())
+
+
+def dhcp_fixture(pools):
+    """ผล 'show running-config | section dhcp' ของ router ที่มี pool จำนวนมาก"""
+    lines = []
+    for i in range(pools):
+        subnet = f"10.{i // 256}.{i % 256}"
+        lines.append(f"ip dhcp excluded-address {subnet}.1 {subnet}.10")
+    for i in range(pools):
+        subnet = f"10.{i // 256}.{i % 256}"
+        lines += [
+            f"ip dhcp pool VLAN{i}",
+            f" network {subnet}.0 255.255.255.0",
+            f" default-router {subnet}.1",
+            " dns-server 8.8.8.8 1.1.1.1",
+            " lease 0 8",
+        ]
+    return "\n".join(lines)
+
+
+def acl_fixture(acls, rules):
+    """ผล 'show ip access-lists' (standard แบบตัวเลขเท่านั้น เพื่อเทียบกับ parser เดิมได้)"""
+    lines = []
+    for i in range(acls):
+        lines.append(f"Standard IP access list {i + 1}")
+        for r in range(rules):
+            lines.append(
+                f"    {(r + 1) * 10} permit 192.168.{r % 256}.0, wildcard bits 0.0.0.255 ({r * 3} matches)"
+            )
+    return "\n".join(lines)
+
+
+def interface_fixture(interfaces, acls):
+    """ผล 'show ip interface' ของ router ที่มี subinterface จำนวนมาก"""
+    lines = []
+    for i in range(interfaces):
+        name = f"GigabitEthernet0/0.{i + 100}"
+        acl = str(i % acls + 1)
+        lines += [
+            f"{name} is up, line protocol is up",
+            f"  Internet address is 10.{i // 256}.{i % 256}.1/24",
+            "  Broadcast address is 255.255.255.255",
+            "  Address determined by non-volatile memory",
+            "  MTU is 1500 bytes",
+            "  Helper address is not set",
+            "  Directed broadcast forwarding is disabled",
+            f"  Outgoing access list is {acl if i % 3 == 0 else 'not set'}",
+            f"  Inbound  access list is {acl if i % 2 == 0 else 'not set'}",
+            "  Proxy ARP is enabled",
+            "  Local Proxy ARP is disabled",
+            "  Security level is default",
+            "  Split horizon is enabled",
+            "  ICMP redirects are always sent",
+            "  ICMP unreachables are always sent",
+            "  ICMP mask replies are never sent",
+            "  IP fast switching is enabled",
+            "  IP CEF switching is enabled",
+        ]
+    return "\n".join(lines)
+
+
+def bench(label, func, args, rounds):
+    best = min(timeit.repeat(lambda: func(*args), number=rounds, repeat=5))
+    per_call = best / rounds * 1000
+    print(f"  {label:<8} {per_call:8.3f} ms/call")
+    return per_call
+
+
+def main():
+    interfaces = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    acl_count = max(1, interfaces // 10)
+
+    dhcp_raw = dhcp_fixture(interfaces)
+    acl_raw = acl_fixture(acl_count, 20)
+    interface_raw = interface_fixture(interfaces, acl_count)
+    print(
+        f"Fixtures: {len(dhcp_raw.splitlines())} DHCP lines, {len(acl_raw.splitlines())} ACL lines, "
+        f"{len(interface_raw.splitlines())} interface lines"
+    )
+
+    cases = [
+        (
+            "parse_dhcp_pools",
+            legacy_parse_dhcp_pools,
+            ios_parsers.parse_dhcp_pools,
+            (dhcp_raw,),
+        ),
+        (
+            "parse_acls",
+            legacy_parse_acls,
+            ios_parsers.parse_acls,
+            (acl_raw, interface_raw),
+        ),
+    ]
+    failed = False
+    for name, legacy, current, args in cases:
+        if legacy(*args) != current(*args):
+            print(f"{name}: MISMATCH between legacy and current parser")
+            failed = True
+            continue
+        print(f"{name}: results match")
+        old = bench("legacy", legacy, args, rounds)
+        new = bench("current", current, args, rounds)
+        print(f"  speedup  {old / new:8.2f}x")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+class Backpressure:
+    """ปรับการ poll ตามจำนวนงานที่ค้างใน router_jobs ต่อ worker หนึ่งตัว"""
+
+    def __init__(
+        self, high_per_consumer=20, low_per_consumer=5, max_stretch=8.0, cooldown=10.0
+    ):
+        self.high_per_consumer = high_per_consumer
+        self.low_per_consumer = low_per_consumer
+        self.max_stretch = max_stretch
+        self.cooldown = cooldown
+        self.stretch = 1.0
+        self._last_adjust = float("-inf")
+
+    def observe(self, depth, consumers, now):
+        """คืนจำนวน poll สูงสุดที่ส่งได้ในจังหวะนี้ และปรับตัวคูณ interval (stretch)"""
+        if consumers == 0:
+            # ไม่มี worker เลย ส่งไปก็มีแต่ค้างในคิว
+            self.stretch = self.max_stretch
+            return 0
+
+        backlog = depth / consumers
+        if now - self._last_adjust >= self.cooldown:
+            if backlog > self.high_per_consumer and self.stretch < self.max_stretch:
+                self.stretch = min(self.max_stretch, self.stretch * 2)
+                self._last_adjust = now
+                print(f"Backlog {depth} jobs: stretching poll interval x{self.stretch}")
+            elif backlog < self.low_per_consumer and self.stretch > 1.0:
+                self.stretch = max(1.0, self.stretch / 2)
+                self._last_adjust = now
+                print(f"Backlog {depth} jobs: poll interval x{self.stretch}")
+
+        # เว้นที่ในคิวไว้ให้งาน config จากหน้าเว็บไม่ต้องรอหลังงาน poll จำนวนมาก
+        return max(0, self.high_per_consumer * consumers - depth)
@@ -1,19 +1,134 @@
 import os
+import threading
+import time
 import couchdb
 
+PAGE_SIZE = int(os.environ.get("ROUTER_PAGE_SIZE", "200"))
+# "poll" = อ่าน _all_docs ทีละหน้าทุกรอบ, "changes" = เก็บชุดเราเตอร์ในหน่วยความจำแล้ว sync ด้วย _changes
+SYNC_MODE = os.environ.get("ROUTER_SYNC_MODE", "poll")
+
+_server = None
+
+
+def get_db():
+    global _server
+    if _server is None:
+        _server = couchdb.Server(os.environ.get("COUCHDB_URI"))
+    try:
+        return _server[os.environ.get("ROUTER_DB_NAME")]
+    except couchdb.ResourceNotFound:
+        return None
 
-def get_router_info():
-    couchdb_uri = os.environ.get("COUCHDB_URI")
-    db_name = os.environ.get("ROUTER_DB_NAME")
 
-    server = couchdb.Server(couchdb_uri)
+def get_or_create_db(name):
+    """เปิด database อื่นบน server เดียวกัน (สร้างให้ถ้ายังไม่มี)"""
+    get_db()
     try:
-        db = server[db_name]
+        return _server[name]
     except couchdb.ResourceNotFound:
-        return []
+        try:
+            return _server.create(name)
+        except couchdb.PreconditionFailed:
+            # replica อื่นสร้างไปพร้อมกันแล้ว
+            return _server[name]
+
+
+def is_router_doc(doc_id, doc):
+    # ข้าม design document (เช่น _design/routers ที่ web สร้างไว้)
+    return doc is not None and not doc_id.startswith("_design/") and "ip" in doc
+
+
+def iter_router_pages(db=None, page_size=PAGE_SIZE):
+    """อ่านเราเตอร์ทีละหน้าผ่าน _all_docs?include_docs=true (request เดียวต่อหน้า)"""
+    db = db or get_db()
+    if db is None:
+        return
+    startkey = None
+    while True:
+        options = {"include_docs": True, "limit": page_size + 1}
+        if startkey is not None:
+            options["startkey"] = startkey
+        rows = list(db.view("_all_docs", **options))
+        page = [row.doc for row in rows[:page_size] if is_router_doc(row.id, row.doc)]
+        if page:
+            yield page
+        if len(rows) <= page_size:
+            return
+        # แถวเกินมาหนึ่งแถวคือจุดเริ่มของหน้าถัดไป
+        startkey = rows[page_size].id
+
+
+class RouterSet:
+    """ชุดเราเตอร์ในหน่วยความจำที่ sync กับ _changes feed ทำให้รอบปกติไม่ต้องอ่าน DB"""
 
-    router_data = [db.get(doc_id) for doc_id in db]
-    return router_data
+    def __init__(self):
+        self._routers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sync_forever, daemon=True)
+            self._thread.start()
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._routers.values())
+
+    def _load(self, db):
+        # จำ seq ก่อนอ่าน เพื่อให้ feed เล่นซ้ำการเปลี่ยนแปลงที่เกิดระหว่างโหลด (ทำซ้ำได้ไม่เสียหาย)
+        since = db.info()["update_seq"]
+        routers = {}
+        for page in iter_router_pages(db):
+            for doc in page:
+                routers[doc["_id"]] = doc
+        with self._lock:
+            self._routers = routers
+        print(f"Loaded {len(routers)} routers, following changes")
+        return since
+
+    def _apply(self, change):
+        with self._lock:
+            doc = change.get("doc")
+            if change.get("deleted") or not is_router_doc(change["id"], doc):
+                self._routers.pop(change["id"], None)
+            else:
+                self._routers[change["id"]] = doc
+
+    def _sync_forever(self):
+        while True:
+            try:
+                db = get_db()
+                if db is None:
+                    time.sleep(5)
+                    continue
+                since = self._load(db)
+                for change in db.changes(
+                    feed="continuous", since=since, include_docs=True, heartbeat=30000
+                ):
+                    if "seq" in change:
+                        self._apply(change)
+            except Exception as e:
+                print(f"Router changes feed dropped: {e}. Reloading...")
+                time.sleep(5)
+
+
+_router_set = RouterSet()
+
+
+def router_pages():
+    """เราเตอร์สำหรับรอบ poll นี้ เป็นหน้า ๆ ตามโหมดที่ตั้งไว้"""
+    if SYNC_MODE == "changes":
+        _router_set.start()
+        routers = _router_set.snapshot()
+        if routers:
+            yield routers
+        return
+    yield from iter_router_pages()
+
+
+def get_router_info():
+    return [doc for page in router_pages() for doc in page]
 
 
 if __name__ == "__main__":
@@ -0,0 +1,136 @@
+import atexit
+import hashlib
+import os
+import socket
+import threading
+import time
+import couchdb
+from database import get_or_create_db
+
+LEASE_DB_NAME = os.environ.get("SCHEDULER_LEASE_DB", "scheduler_leases")
+LEASE_TTL = float(os.environ.get("SCHEDULER_LEASE_TTL", "15"))
+
+
+def owner_of(ip, members):
+    """rendezvous hashing: เลือก member ที่ได้คะแนน hash(member, ip) สูงสุด
+
+    เมื่อมี replica เพิ่มหรือหายไป จะย้ายแค่เราเตอร์ของ replica นั้น ไม่สลับทั้งชุดแบบ hash mod N
+    """
+    if not members:
+        return None
+    return max(
+        members,
+        key=lambda member: hashlib.sha1(f"{member}|{ip}".encode("utf-8")).digest(),
+    )
+
+
+class Membership:
+    """ลงทะเบียน scheduler แต่ละ replica ด้วย lease ใน CouchDB แล้วแบ่งเราเตอร์กันตาม replica ที่ยังมีชีวิต"""
+
+    def __init__(self, member_id=None, ttl=LEASE_TTL, db_name=LEASE_DB_NAME):
+        self.member_id = member_id or os.environ.get(
+            "SCHEDULER_ID", socket.gethostname()
+        )
+        self.ttl = ttl
+        self.db_name = db_name
+        self._members = [self.member_id]
+        self._renewed_at = None
+        self._rev = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            try:
+                self.renew()
+            except Exception as e:
+                print(f"Could not acquire scheduler lease: {e}")
+            self._thread = threading.Thread(target=self._renew_forever, daemon=True)
+            self._thread.start()
+            atexit.register(self.leave)
+
+    def _doc_id(self):
+        return f"member:{self.member_id}"
+
+    def renew(self):
+        """ต่ออายุ lease ของตัวเองแล้วอ่านรายชื่อ member ที่ lease ยังไม่หมด"""
+        db = get_or_create_db(self.db_name)
+        now = time.time()
+        doc = {
+            "_id": self._doc_id(),
+            "member_id": self.member_id,
+            "expires_at": now + self.ttl,
+        }
+        if self._rev:
+            doc["_rev"] = self._rev
+        try:
+            _, self._rev = db.save(doc)
+        except couchdb.ResourceConflict:
+            # rev ที่จำไว้เก่า (เช่นรีสตาร์ทด้วยชื่อเดิม หรือหยุดไปนานจน replica อื่นลบ lease ทิ้งแล้ว)
+            existing = db.get(self._doc_id())
+            if existing is None:
+                doc.pop("_rev", None)
+            else:
+                doc["_rev"] = existing.rev
+            self._rev = None
+            _, self._rev = db.save(doc)
+
+        members = []
+        for row in db.view("_all_docs", include_docs=True):
+            if not row.id.startswith("member:"):
+                continue
+            expires_at = row.doc.get("expires_at", 0)
+            if expires_at > now:
+                members.append(row.doc["member_id"])
+            elif expires_at < now - 10 * self.ttl:
+                # lease ของ pod ที่ตายไปนานแล้ว ลบทิ้งไม่ให้สะสม
+                try:
+                    db.delete(row.doc)
+                except couchdb.ResourceConflict:
+                    pass
+        if self.member_id not in members:
+            members.append(self.member_id)
+        with self._lock:
+            self._members = sorted(members)
+            self._renewed_at = time.monotonic()
+
+    def _renew_forever(self):
+        while True:
+            time.sleep(self.ttl / 3)
+            try:
+                self.renew()
+            except Exception as e:
+                print(f"Could not renew scheduler lease: {e}")
+
+    def members(self):
+        with self._lock:
+            return list(self._members)
+
+    def is_live(self):
+        """lease ของตัวเองยังไม่หมดอายุ (ถ้าต่อไม่ได้นานเกิน ttl ให้หยุด poll ป้องกันการส่งซ้ำกับ replica อื่น)"""
+        with self._lock:
+            return (
+                self._renewed_at is not None
+                and time.monotonic() - self._renewed_at < self.ttl
+            )
+
+    def is_leader(self):
+        """replica ที่ member_id น้อยสุดเป็น leader ใช้รันงานที่ควรมีตัวเดียว (เช่น retention)"""
+        members = self.members()
+        return self.is_live() and bool(members) and members[0] == self.member_id
+
+    def owned(self, routers, members=None):
+        """เลือกเฉพาะเราเตอร์ที่ replica นี้รับผิดชอบ"""
+        members = members or self.members()
+        return [r for r in routers if owner_of(r["ip"], members) == self.member_id]
+
+    def leave(self):
+        """ลบ lease ตอนปิด ให้ replica อื่นรับเราเตอร์ไปทันทีไม่ต้องรอหมดอายุ"""
+        if not self._rev:
+            return
+        try:
+            db = get_or_create_db(self.db_name)
+            db.delete({"_id": self._doc_id(), "_rev": self._rev})
+        except Exception as e:
+            print(f"Could not release scheduler lease: {e}")
+        self._rev = None
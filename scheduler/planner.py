@@ -0,0 +1,83 @@
+import hashlib
+import math
+import threading
+
+
+def slot_offset(ip, interval):
+    """ตำแหน่งของเราเตอร์ภายในรอบ (0..interval วินาที) จาก hash ของ ip ทำให้คงที่ข้ามการรีสตาร์ท"""
+    digest = hashlib.sha1(ip.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 * interval
+
+
+def next_slot(now, interval, offset):
+    """เวลา (epoch) ถัดไปหลัง now ที่ตรงกับ slot ของเราเตอร์"""
+    return (math.floor((now - offset) / interval) + 1) * interval + offset
+
+
+class PollPlanner:
+    """กระจายการ poll ของแต่ละเราเตอร์ให้ตกคนละจังหวะในรอบ และไม่ส่งซ้ำถ้างานก่อนหน้ายังไม่เสร็จ"""
+
+    def __init__(self, default_interval, pending_timeout_factor=3.0):
+        self.default_interval = default_interval
+        self.pending_timeout_factor = pending_timeout_factor
+        self._next_due = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        # ตัวคูณ interval ที่ backpressure ปรับได้เมื่องานค้างในคิวเยอะ
+        self.stretch = 1.0
+
+    def interval_for(self, router):
+        """ใช้ poll_interval ในเอกสารเราเตอร์ถ้ามี ไม่งั้นใช้ค่า default"""
+        try:
+            interval = float(router.get("poll_interval") or self.default_interval)
+        except (TypeError, ValueError):
+            interval = self.default_interval
+        return max(1.0, interval) * self.stretch
+
+    def retain(self, routers):
+        """ลืมเราเตอร์ที่ถูกลบออกจาก DB แล้ว"""
+        ips = {router["ip"] for router in routers}
+        with self._lock:
+            for table in (self._next_due, self._pending):
+                for ip in list(table):
+                    if ip not in ips:
+                        del table[ip]
+
+    def due(self, routers, now):
+        """คืนรายการเราเตอร์ที่ถึง slot แล้วและไม่มีงาน poll ค้างอยู่"""
+        ready = []
+        with self._lock:
+            for router in routers:
+                ip = router["ip"]
+                interval = self.interval_for(router)
+                offset = slot_offset(ip, interval)
+                due_at = self._next_due.get(ip)
+                if due_at is None:
+                    # เราเตอร์ใหม่: รอถึง slot ของตัวเอง ไม่ยิงพร้อมกันหมด
+                    self._next_due[ip] = next_slot(now, interval, offset)
+                    continue
+                if now < due_at:
+                    continue
+                self._next_due[ip] = next_slot(now, interval, offset)
+
+                enqueued_at = self._pending.get(ip)
+                if enqueued_at is not None and now - enqueued_at < (
+                    interval * self.pending_timeout_factor
+                ):
+                    self.skipped += 1
+                    continue
+                self._pending[ip] = now
+                ready.append(router)
+        return ready
+
+    def defer(self, routers, now):
+        """เลื่อนเราเตอร์ที่ส่งไม่ได้ในจังหวะนี้ (เกินโควตา) ไปจังหวะถัดไป"""
+        with self._lock:
+            for router in routers:
+                self._pending.pop(router["ip"], None)
+                self._next_due[router["ip"]] = now
+
+    def mark_done(self, ip):
+        with self._lock:
+            self._pending.pop(ip, None)
@@ -0,0 +1,55 @@
+import json
+import os
+import threading
+import time
+import pika
+
+EXCHANGE = "poll_results"
+POLL_JOB_TYPES = {"check_interface", "check_interface_batch"}
+
+
+class PollEvents:
+    """รับ event 'poll เสร็จแล้ว' จาก worker ผ่าน fanout exchange เพื่อปลดสถานะ pending ของเราเตอร์"""
+
+    def __init__(self, host, on_done):
+        self.host = host
+        self.on_done = on_done
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._consume_forever, daemon=True)
+            self._thread.start()
+
+    def _on_message(self, ch, method, props, body):
+        try:
+            event = json.loads(body.decode())
+        except ValueError:
+            return
+        if event.get("job_type") not in POLL_JOB_TYPES:
+            return
+        for ip in event.get("ips", []):
+            self.on_done(ip)
+
+    def _consume_forever(self):
+        while True:
+            try:
+                credentials = pika.PlainCredentials(
+                    os.getenv("RABBITMQ_DEFAULT_USER"),
+                    os.getenv("RABBITMQ_DEFAULT_PASS"),
+                )
+                connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(self.host, credentials=credentials)
+                )
+                channel = connection.channel()
+                channel.exchange_declare(exchange=EXCHANGE, exchange_type="fanout")
+                # queue ส่วนตัวของ scheduler ตัวนี้ หายไปเองเมื่อ connection ปิด
+                queue = channel.queue_declare(queue="", exclusive=True).method.queue
+                channel.queue_bind(queue=queue, exchange=EXCHANGE)
+                channel.basic_consume(
+                    queue=queue, on_message_callback=self._on_message, auto_ack=True
+                )
+                channel.start_consuming()
+            except Exception as e:
+                print(f"Poll events consumer dropped: {e}. Reconnecting...")
+                time.sleep(5)
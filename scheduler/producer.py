@@ -1,28 +1,35 @@
-import pika
-import os
+from publisher import Publisher
 
+_publishers = {}
 
-def produce(host, body):
-    # connection = pika.BlockingConnection(pika.ConnectionParameters(host))
-
-    rabbitmq_user = os.getenv("RABBITMQ_DEFAULT_USER")
-    rabbitmq_pass = os.getenv("RABBITMQ_DEFAULT_PASS")
-
-    credentials = pika.PlainCredentials(rabbitmq_user, rabbitmq_pass)
-    parameters = pika.ConnectionParameters(host, credentials=credentials)
-    connection = pika.BlockingConnection(parameters)
-
-    channel = connection.channel()
 
+def declare_topology(channel):
     channel.exchange_declare(exchange="jobs", exchange_type="direct")
     channel.queue_declare(queue="router_jobs")
     channel.queue_bind(
         queue="router_jobs", exchange="jobs", routing_key="check_interfaces"
     )
 
-    channel.basic_publish(exchange="jobs", routing_key="check_interfaces", body=body)
 
-    connection.close()
+def get_publisher(host):
+    """Publisher หนึ่งตัวต่อ host ใช้ connection เดิมตลอดอายุของ scheduler"""
+    if host not in _publishers:
+        _publishers[host] = Publisher(host, declare=declare_topology)
+    return _publishers[host]
+
+
+def produce(host, body):
+    get_publisher(host).publish("jobs", "check_interfaces", body)
+
+
+def produce_batch(host, bodies):
+    """ส่งหลายงานในรอบเดียวบน connection เดียว"""
+    return get_publisher(host).publish_batch("jobs", "check_interfaces", bodies)
+
+
+def queue_depth(host, queue="router_jobs"):
+    """(จำนวนงานที่ค้าง, จำนวน worker ที่ consume อยู่)"""
+    return get_publisher(host).queue_depth(queue)
 
 
 if __name__ == "__main__":
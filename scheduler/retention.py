@@ -0,0 +1,192 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta, UTC
+import couchdb
+from database import get_or_create_db
+
+INTERFACE_DB_NAME = os.environ.get("INTERFACE_DB_NAME", "interface_status")
+BACKUP_DB_NAME = os.environ.get("BACKUP_DB_NAME", "router_backups")
+# เก็บทุก snapshot ภายใน KEEP_ALL_HOURS ชั่วโมง, ชั่วโมงละฉบับจนถึง HOURLY_DAYS วัน, หลังจากนั้นวันละฉบับ
+KEEP_ALL_HOURS = float(os.environ.get("RETENTION_KEEP_ALL_HOURS", "24"))
+HOURLY_DAYS = float(os.environ.get("RETENTION_HOURLY_DAYS", "7"))
+# จำนวน backup ล่าสุดที่เก็บไว้ต่อเราเตอร์ (0 = เก็บทั้งหมด)
+BACKUP_KEEP_LAST = int(os.environ.get("RETENTION_BACKUP_KEEP_LAST", "20"))
+# blob ของ config ที่ไม่มี backup อ้างถึง จะลบเมื่อไม่ได้ถูกใช้มานานกว่านี้ (กันลบ blob ที่ worker เพิ่งเขียน)
+BLOB_GRACE_HOURS = float(os.environ.get("RETENTION_BLOB_GRACE_HOURS", "24"))
+BLOB_PREFIX = "blob:sha256:"
+# ทำงานทุก ๆ กี่วินาที (0 = ปิด)
+RETENTION_INTERVAL = float(os.environ.get("RETENTION_INTERVAL", "3600"))
+PAGE_SIZE = 1000
+
+
+def iter_router_rows(db, view, page_size=PAGE_SIZE):
+    """อ่าน view ที่ key เป็น [router_ip, timestamp] ทีละหน้า แล้วคืน (router_ip, rows) ทีละเราเตอร์"""
+    startkey = None
+    startkey_docid = None
+    router_ip = None
+    group = []
+    while True:
+        options = {"limit": page_size + 1}
+        if startkey is not None:
+            options["startkey"] = startkey
+            options["startkey_docid"] = startkey_docid
+        rows = list(db.view(view, **options))
+        for row in rows[:page_size]:
+            if row.key[0] != router_ip:
+                if group:
+                    yield router_ip, group
+                router_ip, group = row.key[0], []
+            group.append(row)
+        if len(rows) <= page_size:
+            break
+        startkey = rows[page_size].key
+        startkey_docid = rows[page_size].id
+    if group:
+        yield router_ip, group
+
+
+def snapshot_bucket(timestamp, now):
+    """คืน key ของช่วงเวลาที่ snapshot นี้อยู่ (None = เก็บทุกฉบับ)"""
+    age = now - datetime.fromisoformat(timestamp)
+    if age < timedelta(hours=KEEP_ALL_HOURS):
+        return None
+    if age < timedelta(days=HOURLY_DAYS):
+        return timestamp[:13]  # YYYY-MM-DDTHH
+    return timestamp[:10]  # YYYY-MM-DD
+
+
+def expired_snapshots(rows, now):
+    """เลือก snapshot ที่ลบได้: เก็บฉบับใหม่สุดของแต่ละช่วง และฉบับล่าสุดของเราเตอร์เสมอ"""
+    seen = set()
+    expired = []
+    # rows เรียงจากเก่าไปใหม่ ไล่จากใหม่ไปเก่าเพื่อเก็บฉบับใหม่สุดของแต่ละช่วง
+    for index, row in enumerate(reversed(rows)):
+        try:
+            bucket = snapshot_bucket(row.key[1], now)
+        except (TypeError, ValueError):
+            continue
+        if index == 0 or bucket is None or bucket not in seen:
+            seen.add(bucket)
+            continue
+        expired.append(row.id)
+    return expired
+
+
+def delete_docs(db, doc_ids, chunk=500):
+    """ลบเอกสารผ่าน _bulk_docs (อ่าน _rev ล่าสุดจาก _all_docs ก่อน)"""
+    deleted = 0
+    for start in range(0, len(doc_ids), chunk):
+        end = start + chunk
+        rows = db.view("_all_docs", keys=doc_ids[start:end])
+        docs = [
+            {"_id": row.id, "_rev": row.value["rev"], "_deleted": True}
+            for row in rows
+            if row.value and not row.value.get("deleted")
+        ]
+        if docs:
+            deleted += sum(1 for ok, _, _ in db.update(docs) if ok)
+    return deleted
+
+
+def compact(db, design=None):
+    try:
+        db.compact()
+        if design:
+            db.compact(design)
+    except Exception as e:
+        # compaction ต้องใช้สิทธิ์ admin ถ้าไม่ได้ก็แค่ข้ามไป
+        print(f"Could not compact {db.name}: {e}")
+
+
+def prune_snapshots(db, now):
+    expired = []
+    for _, rows in iter_router_rows(db, "snapshots/by_router_time"):
+        expired.extend(expired_snapshots(rows, now))
+    return delete_docs(db, expired)
+
+
+def view_has_config_hash(db):
+    # view รุ่นเก่า (ก่อนมี blob) ไม่ส่ง config_hash มา ถ้าใช้จะนึกว่าไม่มีใครอ้างถึง blob เลย
+    design = db.get("_design/backups") or {}
+    view = design.get("views", {}).get("by_router_time", {})
+    return "config_hash" in view.get("map", "")
+
+
+def prune_blobs(db, referenced, now):
+    """ลบ blob ที่ไม่มี backup record อ้างถึงแล้ว และไม่ได้ถูกใช้ภายใน BLOB_GRACE_HOURS"""
+    cutoff = now - timedelta(hours=BLOB_GRACE_HOURS)
+    expired = []
+    rows = db.view(
+        "_all_docs",
+        startkey=BLOB_PREFIX,
+        endkey=BLOB_PREFIX + "\ufff0",
+        include_docs=True,
+    )
+    for row in rows:
+        if row.id.removeprefix(BLOB_PREFIX) in referenced:
+            continue
+        try:
+            last_used = datetime.fromisoformat(row.doc.get("last_used"))
+        except (TypeError, ValueError):
+            continue
+        if last_used < cutoff:
+            expired.append(row.id)
+    return delete_docs(db, expired)
+
+
+def prune_backups(db, now, keep_last=BACKUP_KEEP_LAST):
+    """เก็บ backup ล่าสุด keep_last รายการต่อเราเตอร์ (keep_last <= 0 = เก็บทั้งหมด ไม่ลบ backup)"""
+    expired = []
+    referenced = set()
+    for _, rows in iter_router_rows(db, "backups/by_router_time"):
+        # rows เรียงจากเก่าไปใหม่ (ไม่ใช้ rows[:-keep_last] เพราะ keep_last=0 จะกลายเป็นไม่ลบอะไรเลยแต่นับว่าอ้างถึงทุกตัว)
+        split = max(0, len(rows) - keep_last) if keep_last > 0 else 0
+        expired.extend(row.id for row in rows[:split])
+        referenced.update(row.value.get("config_hash") for row in rows[split:])
+    deleted = delete_docs(db, expired)
+    if view_has_config_hash(db):
+        deleted += prune_blobs(db, referenced, now)
+    return deleted
+
+
+def run_retention():
+    now = datetime.now(UTC)
+    for name, prune, design in (
+        (INTERFACE_DB_NAME, lambda db: prune_snapshots(db, now), "snapshots"),
+        (BACKUP_DB_NAME, lambda db: prune_backups(db, now), "backups"),
+    ):
+        db = get_or_create_db(name)
+        try:
+            deleted = prune(db)
+        except couchdb.ResourceNotFound:
+            # web ยังไม่ได้ติดตั้ง design document
+            print(f"Retention: no view in {name} yet, skipping")
+            continue
+        print(f"Retention: deleted {deleted} docs from {name}")
+        if deleted:
+            compact(db, design)
+
+
+class RetentionJob:
+    """รัน retention เป็นระยะใน thread แยก เฉพาะ replica ที่เป็น leader (should_run)"""
+
+    def __init__(self, should_run, interval=RETENTION_INTERVAL):
+        self.should_run = should_run
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._run_forever, daemon=True)
+            self._thread.start()
+
+    def _run_forever(self):
+        while True:
+            time.sleep(self.interval)
+            if not self.should_run():
+                continue
+            try:
+                run_retention()
+            except Exception as e:
+                print(f"Retention run failed: {e}")
@@ -1,34 +1,142 @@
 import time
 import os
+import signal
+import sys
 import json  # <--- เปลี่ยนจาก bson
-from producer import produce
-from database import get_router_info
+from producer import produce_batch, queue_depth
+from database import router_pages
+from planner import PollPlanner
+from poll_events import PollEvents
+from backpressure import Backpressure
+from membership import Membership
+from retention import RetentionJob
+
+# จำนวนเราเตอร์ต่อหนึ่งงาน poll (0 หรือ 1 = ส่งทีละเครื่องแบบเดิม)
+BATCH_SIZE = int(os.getenv("POLL_BATCH_SIZE", "0"))
+
+
+def make_batches(routers, size):
+    """แบ่งเราเตอร์เป็นกลุ่มละ size เครื่อง เป็นงาน 'check_interface_batch'"""
+    routers = [r for r in routers if r and r.get("ip")]
+    for start in range(0, len(routers), size):
+        end = start + size
+        chunk = routers[start:end]
+        yield {
+            "job_type": "check_interface_batch",
+            "routers": [
+                {"ip": r["ip"], "user": r.get("user"), "password": r.get("password")}
+                for r in chunk
+            ],
+        }
+
+
+def load_routers():
+    """อ่านรายชื่อเราเตอร์ทั้งหมด (ทีละหน้า) เพื่อใช้วางแผนรอบถัดไป"""
+    return [router for page in router_pages() for router in page]
+
+
+def publish_polls(host, routers):
+    if BATCH_SIZE > 1:
+        # ส่งเป็นงาน poll แบบกลุ่ม ให้ worker รัน Ansible ครั้งเดียวต่อหลายเครื่อง
+        jobs = make_batches(routers, BATCH_SIZE)
+    else:
+        jobs = routers
+    # enqueued_at ให้ worker วัดเวลารอในคิวของแต่ละ lane ได้
+    enqueued_at = time.time()
+    # vvv เปลี่ยนมาใช้ json.dumps vvv
+    bodies = [
+        json.dumps(dict(job, enqueued_at=enqueued_at)).encode("utf-8") for job in jobs
+    ]
+    return produce_batch(host, bodies)
 
 
 def scheduler():
-    INTERVAL = 30.0
-    next_run = time.monotonic()
-    count = 0
+    INTERVAL = float(os.getenv("POLL_INTERVAL", "30"))
+    # ตรวจหาเราเตอร์ที่ถึง slot ทุก ๆ TICK วินาที แทนการยิงทั้งหมดทุก 30 วินาที
+    TICK = float(os.getenv("SCHEDULER_TICK", "1"))
     host = os.getenv("RABBITMQ_HOST")
 
-    while True:
-        now = time.time()
-        now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
-        ms = int((now % 1) * 1000)
-        now_str_with_ms = f"{now_str}.{ms:03d}"
-        print(f"[{now_str_with_ms}] run #{count}")
+    planner = PollPlanner(INTERVAL)
+    # ชะลอการ poll เมื่องานใน router_jobs ค้างเกินกว่าที่ worker จะทำทัน
+    backpressure = Backpressure(
+        high_per_consumer=int(os.getenv("BACKPRESSURE_HIGH", "20")),
+        low_per_consumer=int(os.getenv("BACKPRESSURE_LOW", "5")),
+        max_stretch=float(os.getenv("BACKPRESSURE_MAX_STRETCH", "8")),
+    )
+    PollEvents(host, planner.mark_done).start()
+    # หลาย replica แบ่งเราเตอร์กันตาม lease ใน CouchDB
+    membership = Membership()
+    membership.start()
+    # ลบ snapshot/backup เก่าตาม policy (replica เดียวทำ)
+    RetentionJob(membership.is_leader).start()
+    # ให้ atexit ได้ลบ lease ตอน k8s ส่ง SIGTERM
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    routers = []
+    owned = []
+    members = None
+    next_refresh = time.monotonic()
+    next_tick = time.monotonic()
+    count = 0
+    sent = 0
+    deferred = 0
 
+    while True:
         try:
-            for data in get_router_info():
-                # vvv เปลี่ยนมาใช้ json.dumps vvv
-                body_bytes = json.dumps(data).encode("utf-8")
-                produce(host, body_bytes)
+            if time.monotonic() >= next_refresh:
+                now = time.time()
+                now_str = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+                ms = int((now % 1) * 1000)
+                now_str_with_ms = f"{now_str}.{ms:03d}"
+                print(
+                    f"[{now_str_with_ms}] run #{count}: published {sent}, "
+                    f"skipped {planner.skipped} still pending, "
+                    f"deferred {deferred}, interval x{planner.stretch}, "
+                    f"owning {len(owned)}/{len(routers)} routers "
+                    f"({len(members or [])} schedulers)"
+                )
+                routers = load_routers()
+                members = None
+                planner.skipped = 0
+                sent = 0
+                deferred = 0
+                count += 1
+                next_refresh = time.monotonic() + INTERVAL
+
+            if membership.members() != members:
+                # replica เข้า/ออก หรือโหลดรายชื่อเราเตอร์ใหม่: คำนวณส่วนของตัวเองใหม่
+                members = membership.members()
+                owned = membership.owned(routers, members)
+                planner.retain(owned)
+
+            now = time.time()
+            # lease ต่อไม่ได้ แปลว่า replica อื่นอาจรับเราเตอร์ไปแล้ว หยุดส่งไว้ก่อน
+            due = planner.due(owned, now) if membership.is_live() else []
+            if due:
+                depth, consumers = queue_depth(host)
+                budget = backpressure.observe(depth, consumers, time.monotonic())
+                # headroom ของคิวใช้ร่วมกันทุก replica
+                budget = -(-budget // len(members))
+                planner.stretch = backpressure.stretch
+                # budget นับเป็นข้อความ งานแบบกลุ่มหนึ่งข้อความมีหลายเครื่อง
+                limit = budget * max(1, BATCH_SIZE)
+                if len(due) > limit:
+                    planner.defer(due[limit:], now)
+                    deferred += len(due) - limit
+                    due = due[:limit]
+            if due:
+                try:
+                    sent += publish_polls(host, due)
+                except Exception:
+                    # ส่งไม่สำเร็จ ไม่ถือว่ามีงานค้าง ให้ลองใหม่ใน slot ถัดไป
+                    for router in due:
+                        planner.mark_done(router["ip"])
+                    raise
         except Exception as e:
             print(e)
             time.sleep(3)
-        count += 1
-        next_run += INTERVAL
-        time.sleep(max(0.0, next_run - time.monotonic()))
+        next_tick += TICK
+        time.sleep(max(0.0, next_tick - time.monotonic()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,123 @@
+"""unit test ของ worker/config_diff.py
+
+รัน (จาก root ของ repo): python -m unittest discover tests
+อยู่นอก build context ของ Docker จึงไม่ติดไปกับ image ของ worker
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "worker")
+)
+
+from config_diff import config_delta  # noqa: E402
+
+
+class InterfaceDeltaTest(unittest.TestCase):
+    def test_no_ip_address_replaced_by_address(self):
+        running = "interface Gi0/0\n no ip address\n"
+        target = "interface Gi0/0\n ip address 192.168.1.1 255.255.255.0\n"
+        self.assertEqual(
+            config_delta(running, target),
+            ["interface Gi0/0", "ip address 192.168.1.1 255.255.255.0"],
+        )
+
+    def test_address_removed(self):
+        running = "interface Gi0/0\n ip address 192.168.1.1 255.255.255.0\n"
+        target = "interface Gi0/0\n no ip address\n"
+        self.assertEqual(
+            config_delta(running, target),
+            [
+                "interface Gi0/0",
+                "no ip address 192.168.1.1 255.255.255.0",
+                "no ip address",
+            ],
+        )
+
+    def test_no_shutdown_replaced_by_shutdown(self):
+        running = "interface Gi0/0\n no shutdown\n"
+        target = "interface Gi0/0\n shutdown\n"
+        self.assertEqual(config_delta(running, target), ["interface Gi0/0", "shutdown"])
+
+    def test_no_line_missing_from_target(self):
+        running = "interface Gi0/0\n no cdp enable\n"
+        target = "interface Gi0/0\n"
+        self.assertEqual(
+            config_delta(running, target), ["interface Gi0/0", "cdp enable"]
+        )
+
+    def test_same_config(self):
+        config = "hostname R1\ninterface Gi0/0\n ip address 10.0.0.1 255.255.255.0\n"
+        self.assertEqual(config_delta(config, config), [])
+
+
+class BannerDeltaTest(unittest.TestCase):
+    def test_banner_changed(self):
+        running = "banner motd ^CHello # world\nsecond^C\n"
+        target = "banner motd ^CNew^C\n"
+        self.assertEqual(
+            config_delta(running, target), ["no banner motd", "banner motd #New#"]
+        )
+
+    def test_banner_added_with_delimiter_in_body(self):
+        target = "banner motd ^CHello # world\nsecond^C\n"
+        self.assertEqual(
+            config_delta("", target), ["banner motd %Hello # world\nsecond%"]
+        )
+
+    def test_banner_unchanged(self):
+        config = "hostname R1\nbanner login ^CAuthorized only^C\n"
+        self.assertEqual(config_delta(config, config), [])
+
+    def test_banner_removed(self):
+        self.assertEqual(config_delta("banner motd ^COld^C\n", ""), ["no banner motd"])
+
+
+class AclDeltaTest(unittest.TestCase):
+    def test_numbered_acl_reordered(self):
+        running = (
+            "access-list 10 permit 10.0.0.0 0.0.0.255\n"
+            "access-list 10 deny any\n"
+            "access-list 20 permit any\n"
+        )
+        target = "access-list 10 deny any\naccess-list 10 permit 10.0.0.0 0.0.0.255\n"
+        self.assertEqual(
+            config_delta(running, target),
+            [
+                "no access-list 20",
+                "no access-list 10",
+                "access-list 10 deny any",
+                "access-list 10 permit 10.0.0.0 0.0.0.255",
+            ],
+        )
+
+    def test_named_acl_rebuilt(self):
+        running = (
+            "ip access-list extended WEB\n"
+            " permit tcp any any eq 80\n"
+            " deny ip any any\n"
+        )
+        target = (
+            "ip access-list extended WEB\n"
+            " permit tcp any any eq 443\n"
+            " deny ip any any\n"
+        )
+        self.assertEqual(
+            config_delta(running, target),
+            [
+                "no ip access-list extended WEB",
+                "ip access-list extended WEB",
+                "permit tcp any any eq 443",
+                "deny ip any any",
+            ],
+        )
+
+    def test_named_acl_unchanged(self):
+        config = "ip access-list extended WEB\n permit tcp any any eq 80\n"
+        self.assertEqual(config_delta(config, config), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
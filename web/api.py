@@ -0,0 +1,312 @@
+"""JSON API (/api/v1) สำหรับ automation อ่านสถานะเราเตอร์/snapshot/backup และส่งงาน แทนการ scrape หน้า HTML
+
+ทุก list ใช้ view ที่มี index อยู่แล้ว แบ่งหน้าแบบ cursor (ไม่ใช้ skip) และคืนเฉพาะฟิลด์ที่ขอ
+"""
+
+import base64
+import ipaddress
+import json
+
+from flask import Blueprint, jsonify, request
+
+from ios_parsers import snapshot_parsed
+from queries import latest_snapshot, load_backup_config
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+# ฟิลด์ของ snapshot ที่ขอผ่าน ?fields= ได้ (parsed = ผล parse DHCP/ACL)
+SNAPSHOT_FIELDS = (
+    "interfaces",
+    "dns_servers",
+    "dhcp_config_raw",
+    "acl_config_raw",
+    "interface_detail_raw",
+    "parsed",
+)
+DEFAULT_SNAPSHOT_FIELDS = ("interfaces", "dns_servers")
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def is_token(value):
+    """ชื่อ (pool, ACL, interface) ที่ไม่มีช่องว่าง/ขึ้นบรรทัดใหม่ (กันการแทรกคำสั่ง IOS เพิ่ม)"""
+    return (
+        isinstance(value, str) and value != "" and not any(c.isspace() for c in value)
+    )
+
+
+def is_ipv4(value):
+    try:
+        ipaddress.IPv4Address(value)
+        return True
+    except (ipaddress.AddressValueError, ValueError, TypeError):
+        return False
+
+
+def is_prefix(value):
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 32
+
+
+def is_ip_list(value):
+    # ช่องว่าง ("") ใช้ได้เหมือนฟอร์มในหน้าเว็บ worker จะข้ามไป
+    return isinstance(value, list) and all(v == "" or is_ipv4(v) for v in value)
+
+
+def is_acl_rule(rule):
+    """{"action": "permit"|"deny", "source_ip": ip|"any", "wildcard": ip|""}"""
+    if not isinstance(rule, dict) or rule.get("action") not in ("permit", "deny"):
+        return False
+    source_ip = rule.get("source_ip")
+    if source_ip != "any" and not is_ipv4(source_ip):
+        return False
+    wildcard = rule.get("wildcard")
+    return wildcard in (None, "") or is_ipv4(wildcard)
+
+
+def is_acl_rules(value):
+    return isinstance(value, list) and len(value) > 0 and all(map(is_acl_rule, value))
+
+
+def one_of(*choices):
+    return lambda value: value in choices
+
+
+# พารามิเตอร์ของแต่ละ job_type: ชื่อ -> (จำเป็นไหม, ฟังก์ชันตรวจค่า) ตรงกับที่ฟอร์มในหน้าเว็บส่ง
+JOB_PARAMS = {
+    "check_interface": {},
+    "backup": {},
+    "save_config": {},
+    "restore": {
+        "backup_id": (True, is_token),
+        "restore_mode": (False, one_of("replace", "incremental")),
+    },
+    "configure_interface": {
+        "interface_name": (True, is_token),
+        "config_type": (True, one_of("dhcp", "manual", "unassigned")),
+        "ip_address": (False, is_ipv4),
+        "subnet_prefix": (False, is_prefix),
+    },
+    "configure_dns": {"dns_servers": (True, is_ip_list)},
+    "delete_dns": {"dns_server": (True, is_ipv4)},
+    "configure_dhcp": {
+        "pool_name": (True, is_token),
+        "network_address": (True, is_ipv4),
+        "subnet_prefix": (True, is_prefix),
+        "default_gateway": (True, is_ipv4),
+        "exclude_start_ip": (False, is_ipv4),
+        "exclude_end_ip": (False, is_ipv4),
+        "dns_servers": (False, is_ip_list),
+    },
+    "delete_dhcp_pool": {"pool_name": (True, is_token)},
+    "configure_acl": {
+        "acl_number": (True, is_token),
+        "rules": (True, is_acl_rules),
+        "interface_name": (True, is_token),
+        "direction": (True, one_of("in", "out")),
+    },
+    "delete_acl": {"acl_number": (True, is_token)},
+}
+# ค่าเริ่มต้นของพารามิเตอร์ที่ไม่บังคับ (worker ใช้ค่าเหล่านี้ตรง ๆ)
+JOB_DEFAULTS = {
+    "configure_dhcp": {"exclude_end_ip": "", "dns_servers": []},
+}
+
+
+def validate_job(job_type, payload):
+    """สร้าง job จาก payload ตาม JOB_PARAMS (ค่าผิดชนิด/ขาดฟิลด์ = ApiError 400 ไม่ต้องรอไปพังใน worker)"""
+    if job_type not in JOB_PARAMS:
+        raise ApiError(f"Unsupported job_type: {job_type}")
+    job = dict(JOB_DEFAULTS.get(job_type, {}))
+    for param, (required, check) in JOB_PARAMS[job_type].items():
+        if param not in payload or payload[param] is None:
+            if required:
+                raise ApiError(f"Missing field: {param}")
+            continue
+        if not check(payload[param]):
+            raise ApiError(f"Invalid value for {param}")
+        job[param] = payload[param]
+    if job_type == "configure_interface" and job["config_type"] == "manual":
+        for param in ("ip_address", "subnet_prefix"):
+            if param not in job:
+                raise ApiError(f"Missing field: {param}")
+    return job
+
+
+def encode_cursor(key, doc_id):
+    raw = json.dumps([key, doc_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    try:
+        key, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ApiError("Invalid cursor")
+    return key, doc_id
+
+
+def page_limit():
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    return min(max(1, limit), MAX_LIMIT)
+
+
+def requested_fields(allowed, default):
+    """?fields=a,b -> tuple ของฟิลด์ที่ขอ (ไม่ระบุ = default, ฟิลด์ที่ไม่รู้จักถือเป็น error)"""
+    raw = request.args.get("fields")
+    if raw is None:
+        return default
+    fields = tuple(field for field in raw.split(",") if field)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def view_page(db, view, startkey, endkey, descending=False, include_docs=False):
+    """อ่าน view ทีละหน้า คืน (rows, next_cursor) ดึงเกินมาหนึ่งแถวเพื่อใช้เป็นจุดเริ่มของหน้าถัดไป"""
+    limit = page_limit()
+    options = {
+        "descending": descending,
+        "include_docs": include_docs,
+        "limit": limit + 1,
+    }
+    # key เป็น None = ไม่จำกัดช่วง (ส่ง null ไปจะกลายเป็นช่วงของ key ที่เป็น null)
+    if startkey is not None:
+        options["startkey"] = startkey
+    if endkey is not None:
+        options["endkey"] = endkey
+    cursor = request.args.get("cursor")
+    if cursor:
+        options["startkey"], options["startkey_docid"] = decode_cursor(cursor)
+    rows = list(db.view(view, **options))
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_cursor(rows[limit].key, rows[limit].id)
+    return rows[:limit], next_cursor
+
+
+def project_snapshot(doc, fields):
+    item = {"_id": doc["_id"], "timestamp": doc.get("timestamp")}
+    for field in fields:
+        if field == "parsed":
+            item["parsed"] = snapshot_parsed(doc)
+        elif field in doc:
+            item[field] = doc[field]
+    return item
+
+
+def backup_metadata(doc):
+    """ข้อมูลของ backup โดยไม่มีเนื้อหา config (record เก่าที่เก็บ config ไว้ในตัวจะคำนวณ size ให้)"""
+    size = doc.get("size")
+    if size is None and "config" in doc:
+        size = len(doc["config"].encode("utf-8"))
+    return {
+        "_id": doc["_id"],
+        "router_ip": doc.get("router_ip"),
+        "timestamp": doc.get("timestamp"),
+        "config_hash": doc.get("config_hash"),
+        "size": size,
+    }
+
+
+def create_api_blueprint(routers, interface_db, backup_db, job_db, submit_job):
+    api = Blueprint("api", __name__, url_prefix="/api/v1")
+
+    @api.errorhandler(ApiError)
+    def handle_api_error(e):
+        return jsonify({"error": str(e)}), e.status
+
+    @api.route("/routers")
+    def list_routers():
+        # เฉพาะ id และ ip จาก key ของ view (ไม่อ่านเอกสาร ไม่ส่ง credential ออกไป)
+        rows, next_cursor = view_page(routers.router_db, "routers/by_ip", None, None)
+        items = [{"_id": row.id, "ip": row.key} for row in rows]
+        return jsonify({"items": items, "next_cursor": next_cursor})
+
+    @api.route("/routers/<ip>/snapshot")
+    def get_latest_snapshot(ip):
+        fields = requested_fields(SNAPSHOT_FIELDS, DEFAULT_SNAPSHOT_FIELDS)
+        doc = latest_snapshot(interface_db, ip)
+        if doc is None:
+            raise ApiError("No snapshot for this router", 404)
+        item = project_snapshot(doc, fields)
+        item["changed_at"] = doc.get("changed_at", doc.get("timestamp"))
+        return jsonify(item)
+
+    @api.route("/routers/<ip>/snapshots")
+    def list_snapshots(ip):
+        # ไม่ระบุ fields = คืนแค่ id/เวลา จาก view โดยไม่ต้องอ่านเอกสาร
+        fields = requested_fields(SNAPSHOT_FIELDS, ())
+        rows, next_cursor = view_page(
+            interface_db,
+            "snapshots/by_router_time",
+            [ip, {}],
+            [ip],
+            descending=True,
+            include_docs=bool(fields),
+        )
+        if fields:
+            items = [project_snapshot(row.doc, fields) for row in rows]
+        else:
+            items = [{"_id": row.id, "timestamp": row.key[1]} for row in rows]
+        return jsonify({"items": items, "next_cursor": next_cursor})
+
+    @api.route("/routers/<ip>/backups")
+    def list_backups(ip):
+        rows, next_cursor = view_page(
+            backup_db, "backups/by_router_time", [ip, {}], [ip], descending=True
+        )
+        items = [
+            {
+                "_id": row.id,
+                "timestamp": row.value["timestamp"],
+                "config_hash": row.value.get("config_hash"),
+            }
+            for row in rows
+        ]
+        return jsonify({"items": items, "next_cursor": next_cursor})
+
+    @api.route("/backups/<backup_id>")
+    def get_backup(backup_id):
+        doc = backup_db.get(backup_id)
+        if not doc or "router_ip" not in doc:
+            raise ApiError("Backup not found", 404)
+        return jsonify(backup_metadata(doc))
+
+    @api.route("/routers/<ip>/jobs", methods=["POST"])
+    def create_job(ip):
+        payload = request.get_json(silent=True) or {}
+        if not isinstance(payload, dict):
+            raise ApiError("Request body must be a JSON object")
+        job_type = payload.get("job_type")
+        job = validate_job(job_type, payload)
+        router_info_doc = routers.find(ip)
+        if not router_info_doc:
+            raise ApiError("Router credentials not found", 404)
+
+        job.update(job_type=job_type, ip=ip)
+        if job_type == "restore":
+            backup_doc = backup_db.get(job.pop("backup_id"))
+            if not backup_doc or backup_doc.get("router_ip") != ip:
+                raise ApiError("Backup not found", 404)
+            job["config"] = load_backup_config(backup_db, backup_doc)
+        job["user"] = router_info_doc.get("user")
+        job["password"] = router_info_doc.get("password")
+
+        job_id = submit_job(job)
+        return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+    @api.route("/jobs/<job_id>")
+    def get_job(job_id):
+        doc = job_db.get(job_id)
+        if not doc:
+            raise ApiError("Job not found", 404)
+        return jsonify({key: value for key, value in doc.items() if key != "_rev"})
+
+    return api
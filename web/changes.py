@@ -0,0 +1,50 @@
+import threading
+import time
+
+
+class ChangesFeed:
+    """ติดตาม _changes ของ database หนึ่งตัวด้วย thread เดียวต่อ process แล้วส่งต่อให้ listener ทุกตัว"""
+
+    def __init__(self, db, include_docs=False):
+        self.db = db
+        self.include_docs = include_docs
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, listener):
+        with self._lock:
+            self._listeners.append(listener)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._follow, daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, listener):
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _follow(self):
+        since = "now"
+        while True:
+            try:
+                for change in self.db.changes(
+                    feed="continuous",
+                    since=since,
+                    heartbeat=30000,
+                    include_docs=self.include_docs,
+                ):
+                    if "seq" not in change:
+                        # บรรทัด last_seq ตอน feed ถูกปิด
+                        continue
+                    since = change["seq"]
+                    with self._lock:
+                        listeners = list(self._listeners)
+                    for listener in listeners:
+                        try:
+                            listener(change)
+                        except Exception as e:
+                            print(f"Changes listener error: {e}")
+            except Exception as e:
+                print(f"Changes feed for {self.db.name} dropped: {e}. Reconnecting...")
+                time.sleep(5)
@@ -0,0 +1,60 @@
+import threading
+import time
+from collections import OrderedDict
+
+ROUTER_DESIGN = {
+    "_id": "_design/routers",
+    "language": "javascript",
+    "views": {
+        "by_ip": {
+            "map": "function (doc) {\n"
+            "  if (doc.ip) {\n"
+            "    emit(doc.ip, null);\n"
+            "  }\n"
+            "}"
+        }
+    },
+}
+
+
+class RouterDirectory:
+    """ค้นหาเอกสารเราเตอร์ (ip/user/password) จาก ip ผ่าน view by_ip พร้อม cache แบบ TTL + LRU"""
+
+    def __init__(self, router_db, ttl=300.0, max_entries=1024):
+        self.router_db = router_db
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def find(self, ip):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(ip)
+            if entry and entry[0] > now:
+                self._cache.move_to_end(ip)
+                return entry[1]
+
+        doc = None
+        for row in self.router_db.view(
+            "routers/by_ip", key=ip, include_docs=True, limit=1
+        ):
+            doc = row.doc
+
+        with self._lock:
+            # cache ทั้งกรณีเจอและไม่เจอ; การเพิ่ม/ลบเราเตอร์จะล้าง cache ผ่าน _changes
+            self._cache[ip] = (now + self.ttl, doc)
+            self._cache.move_to_end(ip)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return doc
+
+    def list_all(self):
+        return [
+            row.doc for row in self.router_db.view("routers/by_ip", include_docs=True)
+        ]
+
+    def invalidate(self, change=None):
+        """ล้าง cache ทั้งหมด (เอกสารที่ถูกลบจะไม่มี ip ให้รู้ว่าควรล้าง key ไหน)"""
+        with self._lock:
+            self._cache.clear()
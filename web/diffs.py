@@ -0,0 +1,52 @@
+import difflib
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def content_key(backup_doc):
+    """key ของเนื้อหา config: config_hash ของ blob หรือ hash ของ config ที่เก็บไว้ใน record เก่า"""
+    if backup_doc.get("config_hash"):
+        return backup_doc["config_hash"]
+    config_text = backup_doc.get("config", "")
+    return hashlib.sha256(config_text.encode("utf-8")).hexdigest()
+
+
+class DiffCache:
+    """LRU cache ของ diff ระหว่าง config สองฉบับ key เป็นคู่ของ content hash (เนื้อหาเดิมไม่ต้อง diff ซ้ำ)"""
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def diff(self, old_key, new_key, load_old, load_new, context=3):
+        """คืนบรรทัด unified diff (ไม่รวมหัว ---/+++) โหลดเนื้อหาจริงเฉพาะตอนไม่มีใน cache"""
+        key = (old_key, new_key, context)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+
+        if old_key == new_key:
+            lines = []
+        else:
+            old_lines = load_old().splitlines()
+            new_lines = load_new().splitlines()
+            # สองบรรทัดแรกคือหัว ---/+++ ซึ่งขึ้นกับชื่อไฟล์ ไม่เก็บใน cache
+            lines = list(
+                difflib.unified_diff(old_lines, new_lines, lineterm="", n=context)
+            )[2:]
+
+        with self._lock:
+            self._entries[key] = lines
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return lines
+
+
+def diff_stats(lines):
+    added = sum(1 for line in lines if line.startswith("+"))
+    removed = sum(1 for line in lines if line.startswith("-"))
+    return added, removed
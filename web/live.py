@@ -0,0 +1,96 @@
+import json
+import queue
+import threading
+
+CURRENT_PREFIX = "current:"
+
+
+class RouterEvents:
+    """กระจายผล poll ใหม่ของเราเตอร์ไปยัง browser ผ่าน Server-Sent Events
+
+    ทั้ง process ใช้ _changes feed ของ interface_status ร่วมกันตัวเดียว เมื่อ current:<ip> เปลี่ยน
+    จะอ่านเอกสารนั้นครั้งเดียว (เฉพาะเมื่อมีคนดูเราเตอร์นั้นอยู่) แล้วส่งต่อให้ทุก client ที่ดูอยู่
+    client หนึ่งตัวถือ thread ของ server ไว้ตลอดที่เชื่อมต่อ จึงจำกัดจำนวน stream ไว้ที่ max_streams
+    """
+
+    def __init__(self, interface_db, max_streams=32, queue_size=8, heartbeat=15.0):
+        self.interface_db = interface_db
+        self.max_streams = max_streams
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._streams = 0
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def on_change(self, change):
+        """listener ของ ChangesFeed(interface_db)"""
+        doc_id = change.get("id", "")
+        if not doc_id.startswith(CURRENT_PREFIX) or change.get("deleted"):
+            return
+        ip = doc_id.removeprefix(CURRENT_PREFIX)
+        with self._lock:
+            clients = list(self._clients.get(ip, ()))
+        if not clients:
+            return
+        event = self.current_event(ip)
+        if event is None:
+            return
+        for client in clients:
+            self._offer(client, event)
+
+    def current_event(self, ip):
+        current = self.interface_db.get(f"{CURRENT_PREFIX}{ip}")
+        if not current:
+            return None
+        return {
+            "ip": ip,
+            "snapshot_id": current.get("snapshot_id"),
+            "last_seen": current.get("last_seen"),
+            "changed_at": current.get("changed_at"),
+        }
+
+    def _offer(self, client, event):
+        # client ที่อ่านไม่ทัน: ทิ้ง event เก่าสุด (event ใหม่มีสถานะล่าสุดอยู่แล้ว) ไม่ให้ feed ต้องรอ
+        while True:
+            try:
+                client.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    client.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def subscribe(self, ip):
+        """คืน queue ของ client ใหม่ หรือ None ถ้า stream เต็มแล้ว"""
+        client = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if self._streams >= self.max_streams:
+                return None
+            self._streams += 1
+            self._clients.setdefault(ip, set()).add(client)
+        return client
+
+    def unsubscribe(self, ip, client):
+        with self._lock:
+            clients = self._clients.get(ip)
+            if clients is None or client not in clients:
+                return
+            self._streams -= 1
+            clients.discard(client)
+            if not clients:
+                del self._clients[ip]
+
+    def stream(self, ip, client):
+        """generator ของข้อความ text/event-stream ของ client ที่ subscribe แล้ว (ผู้เรียกต้อง unsubscribe เอง)"""
+        yield "retry: 5000\n\n"
+        # สถานะตอนเชื่อมต่อ เผื่อมีผล poll ใหม่ระหว่างโหลดหน้าเว็บกับเปิด stream
+        event = self.current_event(ip)
+        while True:
+            if event is not None:
+                yield f"event: snapshot\ndata: {json.dumps(event)}\n\n"
+            try:
+                event = client.get(timeout=self.heartbeat)
+            except queue.Empty:
+                event = None
+                yield ": keep-alive\n\n"
@@ -0,0 +1,100 @@
+import os
+import threading
+import pika
+
+
+class Publisher:
+    """connection/channel ของ RabbitMQ ที่เปิดค้างไว้ใช้ซ้ำทั้ง process พร้อม reconnect และ publisher confirms"""
+
+    def __init__(self, host, declare=None, confirm=True):
+        self.host = host
+        self.declare = declare
+        self.confirm = confirm
+        self._lock = threading.Lock()
+        self._connection = None
+        self._channel = None
+
+    def _parameters(self):
+        credentials = pika.PlainCredentials(
+            os.getenv("RABBITMQ_DEFAULT_USER"), os.getenv("RABBITMQ_DEFAULT_PASS")
+        )
+        return pika.ConnectionParameters(
+            self.host,
+            credentials=credentials,
+            heartbeat=int(os.getenv("RABBITMQ_HEARTBEAT", "600")),
+            blocked_connection_timeout=30,
+        )
+
+    def _get_channel(self):
+        if (
+            self._connection is None
+            or self._connection.is_closed
+            or self._channel is None
+            or self._channel.is_closed
+        ):
+            self._close()
+            self._connection = pika.BlockingConnection(self._parameters())
+            self._channel = self._connection.channel()
+            if self.confirm:
+                self._channel.confirm_delivery()
+            if self.declare:
+                # ประกาศ exchange/queue แค่ครั้งเดียวต่อ connection
+                self.declare(self._channel)
+        else:
+            # ให้ pika ได้ตอบ heartbeat ที่ค้างอยู่
+            self._connection.process_data_events(0)
+        return self._channel
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        return self.publish_batch(exchange, routing_key, [body], properties)
+
+    def publish_batch(self, exchange, routing_key, bodies, properties=None):
+        """ส่งหลายข้อความบน channel เดียว ถ้า connection หลุดจะต่อใหม่แล้วส่งส่วนที่เหลือ (ลองใหม่ 1 ครั้ง)"""
+        bodies = list(bodies)
+        sent = 0
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    channel = self._get_channel()
+                    while sent < len(bodies):
+                        channel.basic_publish(
+                            exchange=exchange,
+                            routing_key=routing_key,
+                            body=bodies[sent],
+                            properties=properties,
+                        )
+                        sent += 1
+                    return sent
+                except pika.exceptions.AMQPError as e:
+                    self._close()
+                    if attempt:
+                        raise
+                    print(f"RabbitMQ publish failed ({type(e).__name__}), reconnecting")
+        return sent
+
+    def queue_depth(self, queue):
+        """อ่านจำนวนข้อความที่ค้างและจำนวน consumer ของ queue (passive declare ไม่สร้าง queue ใหม่)"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    result = self._get_channel().queue_declare(
+                        queue=queue, passive=True
+                    )
+                    return result.method.message_count, result.method.consumer_count
+                except pika.exceptions.AMQPError:
+                    self._close()
+                    if attempt:
+                        raise
+
+    def _close(self):
+        try:
+            if self._connection and self._connection.is_open:
+                self._connection.close()
+        except Exception:
+            pass
+        self._connection = None
+        self._channel = None
+
+    def close(self):
+        with self._lock:
+            self._close()
@@ -0,0 +1,142 @@
+import gzip
+import couchdb
+
+# view สำหรับหา snapshot/backup ของเราเตอร์หนึ่งเครื่องเรียงตามเวลา โดยไม่ต้องอ่านทั้ง DB
+SNAPSHOT_DESIGN = {
+    "_id": "_design/snapshots",
+    "language": "javascript",
+    "views": {
+        "by_router_time": {
+            "map": "function (doc) {\n"
+            "  if (doc.router_ip && doc.timestamp) {\n"
+            "    emit([doc.router_ip, doc.timestamp], null);\n"
+            "  }\n"
+            "}"
+        }
+    },
+}
+
+BACKUP_DESIGN = {
+    "_id": "_design/backups",
+    "language": "javascript",
+    "views": {
+        "by_router_time": {
+            "map": "function (doc) {\n"
+            "  if (doc.router_ip && doc.timestamp) {\n"
+            "    emit([doc.router_ip, doc.timestamp], {timestamp: doc.timestamp, config_hash: doc.config_hash || null});\n"
+            "  }\n"
+            "}"
+        }
+    },
+}
+
+
+def ensure_design_doc(db, design):
+    """สร้าง/อัปเดต design document ถ้ายังไม่มีหรือเนื้อหาไม่ตรงกับในโค้ด"""
+    existing = db.get(design["_id"])
+    if existing and existing.get("views") == design["views"]:
+        return
+    doc = dict(design)
+    if existing:
+        doc["_rev"] = existing["_rev"]
+    try:
+        db.save(doc)
+        print(f"Installed design document {design['_id']} in {db.name}")
+    except couchdb.ResourceConflict:
+        # web pod ตัวอื่นอัปเดตไปพร้อมกันแล้ว
+        pass
+
+
+def latest_snapshot(interface_db, ip):
+    """ดึง snapshot ล่าสุดของเราเตอร์ผ่าน current:<ip> (worker เขียน snapshot ใหม่เฉพาะตอนเนื้อหาเปลี่ยน)
+
+    timestamp ที่คืนคือเวลาที่ poll เห็นล่าสุด (last_seen) ส่วน changed_at คือเวลาที่เนื้อหาเปลี่ยนครั้งล่าสุด
+    """
+    current = interface_db.get(f"current:{ip}")
+    if current and current.get("snapshot_id"):
+        doc = interface_db.get(current["snapshot_id"])
+        if doc is not None:
+            doc["changed_at"] = doc.get("timestamp")
+            doc["timestamp"] = current.get("last_seen", doc.get("timestamp"))
+            return doc
+    # ข้อมูลเก่าก่อนมี current doc
+    rows = interface_db.view(
+        "snapshots/by_router_time",
+        startkey=[ip, {}],
+        endkey=[ip],
+        descending=True,
+        limit=1,
+        include_docs=True,
+    )
+    for row in rows:
+        return row.doc
+    return None
+
+
+def snapshot_version(interface_db, ip):
+    """ค่าที่เปลี่ยนทุกครั้งที่ snapshot ล่าสุดของเราเตอร์เปลี่ยน (ไม่ต้องโหลด snapshot ทั้งก้อน)
+
+    current:<ip> ถูกเขียนทุกรอบ poll (last_seen) จึงใช้ _rev ของมันได้เลย
+    """
+    current = interface_db.get(f"current:{ip}")
+    if current:
+        return current.get("_rev")
+    rows = interface_db.view(
+        "snapshots/by_router_time",
+        startkey=[ip, {}],
+        endkey=[ip],
+        descending=True,
+        limit=1,
+    )
+    for row in rows:
+        return row.id
+    return None
+
+
+def backup_page(backup_db, ip, page=1, page_size=20):
+    """ดึงรายการ backup (เฉพาะ id และเวลา ไม่ดึงเนื้อหา config) ทีละหน้า เรียงจากใหม่ไปเก่า"""
+    rows = list(
+        backup_db.view(
+            "backups/by_router_time",
+            startkey=[ip, {}],
+            endkey=[ip],
+            descending=True,
+            skip=(page - 1) * page_size,
+            limit=page_size + 1,
+        )
+    )
+    backups = [
+        {"_id": row.id, "timestamp": row.value["timestamp"]} for row in rows[:page_size]
+    ]
+    return backups, len(rows) > page_size
+
+
+def latest_backup(backup_db, ip):
+    """backup ใหม่สุดของเราเตอร์ ({_id, timestamp}) หรือ None"""
+    backups, _ = backup_page(backup_db, ip, 1, 1)
+    return backups[0] if backups else None
+
+
+# ต้องตรงกับ worker/database.py
+BLOB_ATTACHMENT = "config.gz"
+
+
+def load_backup_blob(backup_db, config_hash):
+    """อ่าน config แบบ gzip ของ blob:sha256:<hash> (คืน bytes ที่ยังบีบอัดอยู่)"""
+    attachment = backup_db.get_attachment(f"blob:sha256:{config_hash}", BLOB_ATTACHMENT)
+    if attachment is None:
+        return None
+    try:
+        return attachment.read()
+    finally:
+        attachment.close()
+
+
+def load_backup_config(backup_db, backup_doc):
+    """คืนเนื้อหา config ของ backup record (record เก่าเก็บ config ไว้ในตัวเอง)"""
+    if "config" in backup_doc:
+        return backup_doc["config"]
+    compressed = load_backup_blob(backup_db, backup_doc.get("config_hash"))
+    if compressed is None:
+        return ""
+    return gzip.decompress(compressed).decode("utf-8")
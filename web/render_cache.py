@@ -0,0 +1,37 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def make_etag(*parts):
+    """ETag จากค่าที่หน้าเว็บขึ้นอยู่กับ (เช่น _rev ของ snapshot และ id ของ backup ล่าสุด)"""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """LRU cache ของหน้า HTML ที่ render แล้ว เก็บหนึ่งฉบับต่อ key พร้อม version ของข้อมูลที่ใช้ render
+
+    ถ้า version เปลี่ยน (มี snapshot/backup ใหม่) ฉบับเดิมถือว่าใช้ไม่ได้และจะถูกแทนที่ตอน render ใหม่
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, body):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (version, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,12 +1,40 @@
-from flask import Flask, request, render_template, redirect, url_for, Response
+from flask import (
+    Flask,
+    request,
+    render_template,
+    redirect,
+    url_for,
+    Response,
+    stream_with_context,
+)
 import couchdb
+import pika
 import os
 import json
-import pika
 import time
 import re
 import ipaddress
-
+import uuid
+from datetime import datetime, UTC
+from changes import ChangesFeed
+from credentials import ROUTER_DESIGN, RouterDirectory
+from publisher import Publisher
+from queries import (
+    SNAPSHOT_DESIGN,
+    BACKUP_DESIGN,
+    ensure_design_doc,
+    latest_snapshot,
+    snapshot_version,
+    backup_page,
+    load_backup_blob,
+    load_backup_config,
+    latest_backup,
+)
+from api import create_api_blueprint
+from diffs import DiffCache, content_key, diff_stats
+from ios_parsers import PARSER_VERSION, snapshot_parsed
+from live import RouterEvents
+from render_cache import RenderCache, make_etag
 
 sample = Flask(__name__)
 
@@ -35,6 +63,7 @@ interface_db_name = os.environ.get("INTERFACE_DB_NAME", "interface_status")
 backup_db_name = os.environ.get(
     "BACKUP_DB_NAME", "router_backups"
 )  # <--- เพิ่ม DB สำหรับ backup
+job_db_name = os.environ.get("JOB_DB_NAME", "job_status")
 
 # สร้าง database ถ้ายังไม่มี
 try:
@@ -52,10 +81,37 @@ try:
 except couchdb.PreconditionFailed:
     backup_db = server[backup_db_name]
 
+try:
+    job_db = server.create(job_db_name)
+except couchdb.PreconditionFailed:
+    job_db = server[job_db_name]
+
+# สร้าง view สำหรับ query snapshot/backup ตาม router
+ensure_design_doc(router_db, ROUTER_DESIGN)
+ensure_design_doc(interface_db, SNAPSHOT_DESIGN)
+ensure_design_doc(backup_db, BACKUP_DESIGN)
+BACKUP_PAGE_SIZE = int(os.environ.get("BACKUP_PAGE_SIZE", "20"))
+
+# ค้นหา credential ของเราเตอร์จาก ip (cache จะถูกล้างเมื่อมีการเพิ่ม/ลบเราเตอร์)
+routers = RouterDirectory(
+    router_db, ttl=float(os.environ.get("ROUTER_CACHE_TTL", "300"))
+)
+ChangesFeed(router_db).subscribe(routers.invalidate)
+
+# diff ของ config คู่เดิม (ตาม content hash) คำนวณครั้งเดียว
+diff_cache = DiffCache(int(os.environ.get("DIFF_CACHE_SIZE", "128")))
+# หน้า router_detail ที่ render แล้ว ใช้ซ้ำจนกว่าจะมี snapshot หรือ backup ใหม่
+render_cache = RenderCache(int(os.environ.get("RENDER_CACHE_SIZE", "256")))
+# ส่งผล poll ใหม่ให้หน้า router_detail ที่เปิดอยู่ (feed ของ interface_status ตัวเดียวต่อ process)
+router_events = RouterEvents(
+    interface_db, max_streams=int(os.environ.get("LIVE_MAX_STREAMS", "32"))
+)
+ChangesFeed(interface_db).subscribe(router_events.on_change)
+
 
 @sample.route("/")
 def main():
-    items = [router_db.get(doc_id) for doc_id in router_db]
+    items = routers.list_all()
     return render_template("index.html", items=items)
 
 
@@ -66,6 +122,7 @@ def add_comment():
     password = request.form.get("password")
     if ip and user and password:
         router_db.save({"ip": ip, "user": user, "password": password})
+        routers.invalidate()
     return redirect(url_for("main"))
 
 
@@ -76,6 +133,7 @@ def delete_comment():
         doc = router_db.get(doc_id)
         if doc:
             router_db.delete(doc)
+            routers.invalidate()
     except Exception as e:
         print(f"Error deleting document: {e}")
     return redirect(url_for("main"))
@@ -83,33 +141,41 @@ def delete_comment():
 
 @sample.route("/router/<ip>", methods=["GET"])
 def router_detail(ip):
-    # 1. ดึงข้อมูล Interface (เหมือนเดิม)
-    all_interface_docs = [interface_db.get(doc_id) for doc_id in interface_db]
-    filtered_interface_docs = [
-        doc for doc in all_interface_docs if doc and doc.get("router_ip") == ip
-    ]
-    sorted_interface_docs = sorted(
-        filtered_interface_docs, key=lambda x: x.get("timestamp", ""), reverse=True
-    )
-    latest_interface_data = None
-    if sorted_interface_docs:
-        latest_interface_data = sorted_interface_docs[0]
-    # limited_interface_docs = sorted_interface_docs[:3]
-
-    dhcp_raw_text = (
-        latest_interface_data.get("dhcp_config_raw", "")
-        if latest_interface_data
-        else ""
+    page = max(1, request.args.get("page", 1, type=int))
+
+    # หน้าเปลี่ยนเฉพาะตอนมี snapshot หรือ backup ใหม่ เช็ค version ก่อน (request เล็กสองครั้ง)
+    # (backup เก่าที่ retention ลบไปจะหายจากหน้าเมื่อมี backup ใหม่ครั้งถัดไป)
+    newest_backup = latest_backup(backup_db, ip)
+    version = (
+        snapshot_version(interface_db, ip),
+        newest_backup["_id"] if newest_backup else None,
+        PARSER_VERSION,
     )
-    dhcp_pools, excluded_addresses = parse_dhcp_pools(dhcp_raw_text)
-
-    # 2. vvv ดึงข้อมูล Backup vvv
-    all_backup_docs = [backup_db.get(doc_id) for doc_id in backup_db]
-    filtered_backup_docs = [
-        doc for doc in all_backup_docs if doc and doc.get("router_ip") == ip
-    ]
-    sorted_backup_docs = sorted(
-        filtered_backup_docs, key=lambda x: x.get("timestamp", ""), reverse=True
+    etag = make_etag(ip, page, version)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        body = render_cache.get((ip, page), version)
+        if body is None:
+            body = render_router_detail(ip, page)
+            render_cache.put((ip, page), version, body)
+        response = Response(body, mimetype="text/html")
+
+    # validator ชุดเดียวกันทั้ง 200 และ 304 ให้ browser ถามกลับทุกครั้ง (ได้ 304 ถ้ายังไม่เปลี่ยน)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def render_router_detail(ip, page):
+    # 1. ดึงข้อมูล Interface ล่าสุดจาก view (request เดียว)
+    latest_interface_data = latest_snapshot(interface_db, ip)
+    # worker parse DHCP/ACL ไว้ให้แล้วตอนบันทึก snapshot
+    parsed = snapshot_parsed(latest_interface_data)
+
+    # 2. vvv ดึงรายการ Backup ทีละหน้า vvv
+    sorted_backup_docs, has_more_backups = backup_page(
+        backup_db, ip, page, BACKUP_PAGE_SIZE
     )
 
     # ดึงข้อมูล DNS จากเอกสารล่าสุด
@@ -117,51 +183,83 @@ def router_detail(ip):
     if latest_interface_data and "dns_servers" in latest_interface_data:
         current_dns_servers = latest_interface_data["dns_servers"]
 
-    acl_raw_text = (
-        latest_interface_data.get("acl_config_raw", "") if latest_interface_data else ""
-    )
-    interface_detail_raw_text = (
-        latest_interface_data.get("interface_detail_raw", "")
-        if latest_interface_data
-        else ""
-    )
-    acls = parse_acls(acl_raw_text, interface_detail_raw_text)
-
     return render_template(
         "router_detail.html",
         router_ip=ip,
         interface_data=latest_interface_data,
         backup_data=sorted_backup_docs,
+        backup_page=page,
+        backup_has_more=has_more_backups,
         current_dns=current_dns_servers,
-        dhcp_pools=dhcp_pools,
-        dhcp_excluded=excluded_addresses,
-        acls=acls,
+        dhcp_pools=parsed["dhcp_pools"],
+        dhcp_excluded=parsed["dhcp_excluded"],
+        acls=parsed["acls"],
+    )
+
+
+@sample.route("/router/<ip>/events")
+def router_events_stream(ip):
+    """Server-Sent Events: แจ้ง browser ทุกครั้งที่ poll ของเราเตอร์นี้บันทึกผลใหม่"""
+    client = router_events.subscribe(ip)
+    if client is None:
+        # stream เต็ม: browser จะไม่ต่อใหม่ หน้าเว็บยังใช้ได้แค่ไม่อัปเดตเอง
+        return Response(
+            "Too many live streams", status=503, headers={"Retry-After": "30"}
+        )
+    response = Response(
+        stream_with_context(router_events.stream(ip, client)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
+    # คืนที่ให้ client อื่นเมื่อ connection ปิด (แม้ generator ยังไม่เคยเริ่ม)
+    response.call_on_close(lambda: router_events.unsubscribe(ip, client))
+    return response
 
 
 # --- ฟังก์ชันสำหรับส่ง message ไปยัง RabbitMQ ---
+# งานที่ผู้ใช้กดจากหน้าเว็บมีคิวของตัวเอง ไม่ต้องต่อท้ายงาน poll ใน router_jobs
+JOB_QUEUE = "router_jobs.interactive"
+
+
+def declare_job_queue(channel):
+    channel.queue_declare(queue=JOB_QUEUE, durable=True)
+
+
+# ใช้ connection เดียวทั้ง process แทนการเปิด/ปิดทุกครั้งที่ส่งงาน
+publisher = Publisher(os.getenv("RABBITMQ_HOST", "rabbitmq"), declare=declare_job_queue)
+
+
+# งานที่บันทึกสถานะ 'queued' แล้วต้องไม่หายตอน RabbitMQ restart
+PERSISTENT = pika.BasicProperties(delivery_mode=2)
+
+
 def send_to_rabbitmq(body):
-    rabbitmq_user = os.getenv("RABBITMQ_DEFAULT_USER")
-    rabbitmq_pass = os.getenv("RABBITMQ_DEFAULT_PASS")
-    rabbitmq_host = os.getenv("RABBITMQ_HOST", "rabbitmq")
+    publisher.publish("", JOB_QUEUE, body, PERSISTENT)
 
-    credentials = pika.PlainCredentials(rabbitmq_user, rabbitmq_pass)
-    parameters = pika.ConnectionParameters(rabbitmq_host, credentials=credentials)
-    connection = pika.BlockingConnection(parameters)
-    channel = connection.channel()
 
-    channel.queue_declare(queue="router_jobs")
-    channel.basic_publish(exchange="", routing_key="router_jobs", body=body)
-    connection.close()
+def submit_job(job):
+    """ใส่ job_id ให้งาน บันทึกสถานะ 'queued' แล้วส่งงานเข้า RabbitMQ"""
+    job["job_id"] = uuid.uuid4().hex
+    job["enqueued_at"] = time.time()
+    try:
+        job_db.save(
+            {
+                "_id": job["job_id"],
+                "status": "queued",
+                "job_type": job.get("job_type"),
+                "router_ip": job.get("ip"),
+                "created_at": datetime.now(UTC).isoformat(),
+            }
+        )
+    except Exception as e:
+        print(f"Could not record job {job['job_id']}: {e}")
+    send_to_rabbitmq(json.dumps(job).encode("utf-8"))
+    return job["job_id"]
 
 
 @sample.route("/router/<ip>/backup", methods=["POST"])
 def backup_router(ip):
-    doc_to_backup = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == ip:
-            doc_to_backup = row.doc
-            break
+    doc_to_backup = routers.find(ip)
 
     if doc_to_backup:
         job = {
@@ -170,8 +268,7 @@ def backup_router(ip):
             "user": doc_to_backup.get("user"),
             "password": doc_to_backup.get("password"),
         }
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        submit_job(job)
 
     return redirect(url_for("router_detail", ip=ip))
 
@@ -183,18 +280,26 @@ def download_backup(backup_id):
     if not backup_doc:
         return "Backup not found", 404
 
-    config_text = backup_doc.get("config", "")
     router_ip = backup_doc.get("router_ip", "router")
     timestamp = backup_doc.get("timestamp", "").split("T")[0]  # เอาเฉพาะวันที่
 
     # สร้างชื่อไฟล์
     filename = f"backup-{router_ip}-{timestamp}.txt"
+    headers = {"Content-disposition": f"attachment; filename={filename}"}
+
+    if "config" not in backup_doc and request.accept_encodings["gzip"]:
+        # ส่ง blob ที่บีบอัดไว้แล้วไปตรง ๆ ให้ browser แตกเอง ไม่ต้องแตกแล้วบีบใหม่
+        compressed = load_backup_blob(backup_db, backup_doc.get("config_hash"))
+        if compressed is not None:
+            headers["Content-Encoding"] = "gzip"
+            headers["Vary"] = "Accept-Encoding"
+            return Response(compressed, mimetype="text/plain", headers=headers)
 
     # สร้าง Response เพื่อให้ browser ดาวน์โหลด
     return Response(
-        config_text,
+        load_backup_config(backup_db, backup_doc),
         mimetype="text/plain",
-        headers={"Content-disposition": f"attachment; filename={filename}"},
+        headers=headers,
     )
 
 
@@ -209,12 +314,63 @@ def view_backup(backup_id):
         return "Backup not found", 404
 
     # ส่งข้อมูล backup ทั้งหมดไปให้ template 'view_backup.html'
-    return render_template("view_backup.html", backup=backup_doc)
+    backup = dict(backup_doc, config=load_backup_config(backup_db, backup_doc))
+    return render_template("view_backup.html", backup=backup)
 
 
 # ^^^ จบส่วนที่เพิ่ม ^^^
 
 
+@sample.route("/backup/<backup_id>/diff")
+def diff_backup(backup_id):
+    """เทียบ backup กับ backup อื่น (?against=<id>) หรือกับ backup ล่าสุดของเราเตอร์ (?against=latest ค่าเริ่มต้น)
+
+    backup ล่าสุดไม่ใช่ running-config ปัจจุบัน ถ้าต้องการเทียบกับของจริงให้สั่ง backup ใหม่ก่อน
+    """
+    backup_doc = backup_db.get(backup_id)
+    if not backup_doc:
+        return "Backup not found", 404
+
+    against = request.args.get("against", "latest")
+    if against == "latest":
+        latest = latest_backup(backup_db, backup_doc.get("router_ip"))
+        other_doc = backup_db.get(latest["_id"]) if latest else None
+    else:
+        other_doc = backup_db.get(against)
+    if not other_doc:
+        return "Backup to compare against not found", 404
+
+    # เทียบจากฉบับเก่าไปฉบับใหม่เสมอ
+    old_doc, new_doc = sorted(
+        [backup_doc, other_doc], key=lambda doc: doc.get("timestamp", "")
+    )
+    context = max(0, request.args.get("context", 3, type=int))
+    lines = diff_cache.diff(
+        content_key(old_doc),
+        content_key(new_doc),
+        lambda: load_backup_config(backup_db, old_doc),
+        lambda: load_backup_config(backup_db, new_doc),
+        context,
+    )
+
+    if request.args.get("format") == "text":
+        header = [
+            f"--- {old_doc.get('router_ip')} {old_doc.get('timestamp')}",
+            f"+++ {new_doc.get('router_ip')} {new_doc.get('timestamp')}",
+        ]
+        return Response("\n".join(header + lines) + "\n", mimetype="text/plain")
+
+    added, removed = diff_stats(lines)
+    return render_template(
+        "diff_backup.html",
+        old=old_doc,
+        new=new_doc,
+        lines=lines,
+        added=added,
+        removed=removed,
+    )
+
+
 # vvv เพิ่ม Route นี้เข้าไป vvv
 @sample.route("/backup/<backup_id>/restore", methods=["POST"])
 def restore_backup(backup_id):
@@ -223,14 +379,10 @@ def restore_backup(backup_id):
         return "Backup not found", 404
 
     router_ip = backup_doc.get("router_ip")
-    config_text = backup_doc.get("config")
+    config_text = load_backup_config(backup_db, backup_doc)
 
     # ค้นหาข้อมูล credential ของเราเตอร์จาก DB
-    router_info_doc = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == router_ip:
-            router_info_doc = row.doc
-            break
+    router_info_doc = routers.find(router_ip)
 
     if router_info_doc:
         # สร้าง "งาน" ที่มี job_type เป็น 'restore'
@@ -241,8 +393,10 @@ def restore_backup(backup_id):
             "password": router_info_doc.get("password"),
             "config": config_text,  # <--- แนบเนื้อหา config ไปด้วย
         }
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        # "incremental" = ส่งเฉพาะส่วนต่างจาก running-config (ไม่ระบุ = ใช้ค่า RESTORE_MODE ของ worker)
+        if request.form.get("restore_mode") in ("replace", "incremental"):
+            job["restore_mode"] = request.form["restore_mode"]
+        submit_job(job)
 
     # หลังจากส่งงานแล้ว ให้ redirect กลับไปหน้ารายละเอียด
     return redirect(url_for("router_detail", ip=router_ip, status="restore_sent"))
@@ -268,11 +422,7 @@ def config_interface(ip, interface_name):
         }
 
         # ค้นหา Credential
-        router_info_doc = None
-        for row in router_db.view("_all_docs", include_docs=True):
-            if row.doc and row.doc.get("ip") == ip:
-                router_info_doc = row.doc
-                break
+        router_info_doc = routers.find(ip)
 
         if not router_info_doc:
             return "Router credentials not found", 404
@@ -284,8 +434,7 @@ def config_interface(ip, interface_name):
             job["ip_address"] = request.form.get("ip_address")
             job["subnet_prefix"] = request.form.get("subnet_prefix")
 
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        submit_job(job)
 
         # ส่งกลับไปหน้ารายละเอียดพร้อม pop-up
         return redirect(url_for("router_detail", ip=ip, status="config_sent"))
@@ -305,11 +454,7 @@ def config_dns(ip):
         job = {"job_type": "configure_dns", "ip": ip, "dns_servers": [dns1, dns2]}
 
         # ค้นหา Credential
-        router_info_doc = None
-        for row in router_db.view("_all_docs", include_docs=True):
-            if row.doc and row.doc.get("ip") == ip:
-                router_info_doc = row.doc
-                break
+        router_info_doc = routers.find(ip)
 
         if not router_info_doc:
             return "Router credentials not found", 404
@@ -317,8 +462,7 @@ def config_dns(ip):
         job["user"] = router_info_doc.get("user")
         job["password"] = router_info_doc.get("password")
 
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        submit_job(job)
 
         # ส่งกลับไปหน้ารายละเอียดพร้อม pop-up
         return redirect(url_for("router_detail", ip=ip, status="dns_config_sent"))
@@ -338,11 +482,7 @@ def delete_dns_server(ip):
     }
 
     # ค้นหา Credential
-    router_info_doc = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == ip:
-            router_info_doc = row.doc
-            break
+    router_info_doc = routers.find(ip)
 
     if not router_info_doc:
         return "Router credentials not found", 404
@@ -350,8 +490,7 @@ def delete_dns_server(ip):
     job["user"] = router_info_doc.get("user")
     job["password"] = router_info_doc.get("password")
 
-    body_bytes = json.dumps(job).encode("utf-8")
-    send_to_rabbitmq(body_bytes)
+    submit_job(job)
 
     # ส่งกลับไปหน้ารายละเอียดพร้อม pop-up
     return redirect(url_for("router_detail", ip=ip, status="dns_delete_sent"))
@@ -377,11 +516,7 @@ def config_dhcp(ip):
         }
 
         # 2. ค้นหา Credential ของ Router
-        router_info_doc = None
-        for row in router_db.view("_all_docs", include_docs=True):
-            if row.doc and row.doc.get("ip") == ip:
-                router_info_doc = row.doc
-                break
+        router_info_doc = routers.find(ip)
 
         if not router_info_doc:
             return "Router credentials not found", 404
@@ -390,8 +525,7 @@ def config_dhcp(ip):
         job["password"] = router_info_doc.get("password")
 
         # 3. ส่ง Job ไปที่ RabbitMQ
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        submit_job(job)
 
         # 4. Redirect กลับไปพร้อม Alert
         # เราจะสร้าง status ใหม่ชื่อ 'dhcp_config_sent'
@@ -401,46 +535,6 @@ def config_dhcp(ip):
     return render_template("config_dhcp.html", router_ip=ip)
 
 
-def parse_dhcp_pools(raw_config):
-    """
-    แปลง raw config string ของ DHCP ให้เป็น list of dictionaries
-    """
-    if not raw_config:
-        return [], []
-
-    pools = {}
-    excluded_addresses = []
-
-    # แยก excluded addresses ออกมาก่อน
-    for line in raw_config.splitlines():
-        if line.startswith("ip dhcp excluded-address"):
-            parts = line.split()
-            if len(parts) >= 4:
-                excluded_addresses.append(
-                    f"{parts[3]} - {parts[4] if len(parts) > 4 else ''}"
-                )
-
-    # หา pool และค่า config ภายใน
-    current_pool = None
-    for line in raw_config.splitlines():
-        pool_match = re.match(r"^ip dhcp pool\s+(.+)", line)
-        if pool_match:
-            current_pool = pool_match.group(1).strip()
-            pools[current_pool] = {"name": current_pool}
-            continue
-
-        if current_pool and line.startswith(" "):
-            parts = line.strip().split()
-            if parts[0] == "network" and len(parts) >= 3:
-                pools[current_pool]["network"] = f"{parts[1]} / {parts[2]}"
-            elif parts[0] == "default-router" and len(parts) >= 2:
-                pools[current_pool]["default_router"] = parts[1]
-            elif parts[0] == "dns-server" and len(parts) >= 2:
-                pools[current_pool]["dns_servers"] = " ".join(parts[1:])
-
-    return list(pools.values()), excluded_addresses
-
-
 @sample.route("/router/<ip>/dhcp/delete", methods=["POST"])
 def delete_dhcp(ip):
     pool_name = request.form.get("pool_name")
@@ -452,11 +546,7 @@ def delete_dhcp(ip):
     }
 
     # ค้นหา Credential
-    router_info_doc = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == ip:
-            router_info_doc = row.doc
-            break
+    router_info_doc = routers.find(ip)
 
     if not router_info_doc:
         return "Router credentials not found", 404
@@ -464,8 +554,7 @@ def delete_dhcp(ip):
     job["user"] = router_info_doc.get("user")
     job["password"] = router_info_doc.get("password")
 
-    body_bytes = json.dumps(job).encode("utf-8")
-    send_to_rabbitmq(body_bytes)
+    submit_job(job)
 
     # ส่งกลับไปหน้ารายละเอียดพร้อม pop-up
     return redirect(url_for("router_detail", ip=ip, status="dhcp_delete_sent"))
@@ -496,11 +585,7 @@ def edit_dhcp(ip, pool_name):
         }
 
         # 3. ค้นหา Credential (ทำครั้งเดียวพอ)
-        router_info_doc = None
-        for row in router_db.view("_all_docs", include_docs=True):
-            if row.doc and row.doc.get("ip") == ip:
-                router_info_doc = row.doc
-                break
+        router_info_doc = routers.find(ip)
         if not router_info_doc:
             return "Router credentials not found", 404
 
@@ -510,24 +595,17 @@ def edit_dhcp(ip, pool_name):
         )
 
         # 4. ส่ง Job ทั้งสองไปที่ RabbitMQ (ลบก่อนสร้าง)
-        send_to_rabbitmq(json.dumps(delete_job).encode("utf-8"))
-        send_to_rabbitmq(json.dumps(create_job).encode("utf-8"))
+        submit_job(delete_job)
+        submit_job(create_job)
 
         return redirect(url_for("router_detail", ip=ip, status="dhcp_edit_sent"))
 
     # --- จัดการเมื่อผู้ใช้กดปุ่ม "Edit" เพื่อแสดงฟอร์ม ---
     # 1. ดึงข้อมูลล่าสุดจาก DB
-    all_interface_docs = [interface_db.get(doc_id) for doc_id in interface_db]
-    filtered_docs = [
-        doc for doc in all_interface_docs if doc and doc.get("router_ip") == ip
-    ]
-    latest_doc = sorted(
-        filtered_docs, key=lambda x: x.get("timestamp", ""), reverse=True
-    )[0]
-    dhcp_raw_text = latest_doc.get("dhcp_config_raw", "") if latest_doc else ""
-
-    # 2. Parse หา Pool ที่ต้องการแก้ไข
-    all_pools, _ = parse_dhcp_pools(dhcp_raw_text)
+    latest_doc = latest_snapshot(interface_db, ip)
+
+    # 2. หา Pool ที่ต้องการแก้ไข (parse ไว้แล้วใน snapshot)
+    all_pools = snapshot_parsed(latest_doc)["dhcp_pools"]
     pool_to_edit = next(
         (pool for pool in all_pools if pool.get("name") == pool_name), None
     )
@@ -556,11 +634,7 @@ def save_configuration(ip):
     job = {"job_type": "save_config", "ip": ip}
 
     # ค้นหา Credential
-    router_info_doc = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == ip:
-            router_info_doc = row.doc
-            break
+    router_info_doc = routers.find(ip)
 
     if not router_info_doc:
         return "Router credentials not found", 404
@@ -568,8 +642,7 @@ def save_configuration(ip):
     job["user"] = router_info_doc.get("user")
     job["password"] = router_info_doc.get("password")
 
-    body_bytes = json.dumps(job).encode("utf-8")
-    send_to_rabbitmq(body_bytes)
+    submit_job(job)
 
     # ส่งกลับไปหน้ารายละเอียดพร้อม pop-up
     return redirect(url_for("router_detail", ip=ip, status="save_sent"))
@@ -603,19 +676,14 @@ def config_acl(ip):
         }
 
         # 3. ค้นหา Credential และส่ง Job (เหมือนเดิม)
-        router_info_doc = None
-        for row in router_db.view("_all_docs", include_docs=True):
-            if row.doc and row.doc.get("ip") == ip:
-                router_info_doc = row.doc
-                break
+        router_info_doc = routers.find(ip)
         if not router_info_doc:
             return "Router credentials not found", 404
 
         job["user"] = router_info_doc.get("user")
         job["password"] = router_info_doc.get("password")
 
-        body_bytes = json.dumps(job).encode("utf-8")
-        send_to_rabbitmq(body_bytes)
+        submit_job(job)
 
         return redirect(url_for("router_detail", ip=ip, status="acl_config_sent"))
 
@@ -623,48 +691,6 @@ def config_acl(ip):
     return render_template("config_acl.html", router_ip=ip)
 
 
-def parse_acls(acl_raw, interface_raw):
-    """
-    แปลง raw config ของ ACL และ Interface ให้เป็นข้อมูลที่มีโครงสร้าง
-    """
-    if not acl_raw or not interface_raw:
-        return []
-
-    acls = {}
-    # Parse ACL definitions
-    current_acl = None
-    for line in acl_raw.splitlines():
-        acl_match = re.search(r"Standard IP access list (\d+)", line)
-        if acl_match:
-            current_acl = acl_match.group(1)
-            acls[current_acl] = {"name": current_acl, "rules": [], "interfaces": []}
-            continue
-
-        if current_acl and line.startswith(" "):
-            acls[current_acl]["rules"].append(line.strip())
-
-    # Parse interface assignments
-    current_interface = None
-    for line in interface_raw.splitlines():
-        if "line protocol is" in line:
-            current_interface = line.split()[0]
-            continue
-
-        inbound_match = re.search(r"Inbound  access list is (.+)", line)
-        if current_interface and inbound_match:
-            acl_num = inbound_match.group(1).strip()
-            if acl_num in acls:
-                acls[acl_num]["interfaces"].append(f"{current_interface} (in)")
-
-        outbound_match = re.search(r"Outgoing access list is (.+)", line)
-        if current_interface and outbound_match:
-            acl_num = outbound_match.group(1).strip()
-            if acl_num in acls:
-                acls[acl_num]["interfaces"].append(f"{current_interface} (out)")
-
-    return list(acls.values())
-
-
 @sample.route("/router/<ip>/acl/delete", methods=["POST"])
 def delete_acl(ip):
     acl_number = request.form.get("acl_number")
@@ -676,11 +702,7 @@ def delete_acl(ip):
     }
 
     # ค้นหา Credential
-    router_info_doc = None
-    for row in router_db.view("_all_docs", include_docs=True):
-        if row.doc and row.doc.get("ip") == ip:
-            router_info_doc = row.doc
-            break
+    router_info_doc = routers.find(ip)
 
     if not router_info_doc:
         return "Router credentials not found", 404
@@ -688,11 +710,17 @@ def delete_acl(ip):
     job["user"] = router_info_doc.get("user")
     job["password"] = router_info_doc.get("password")
 
-    body_bytes = json.dumps(job).encode("utf-8")
-    send_to_rabbitmq(body_bytes)
+    submit_job(job)
 
     return redirect(url_for("router_detail", ip=ip, status="acl_delete_sent"))
 
 
+# JSON API สำหรับ automation (/api/v1)
+sample.register_blueprint(
+    create_api_blueprint(routers, interface_db, backup_db, job_db, submit_job)
+)
+
+
 if __name__ == "__main__":
-    sample.run(host="0.0.0.0", port=8080)
+    # แต่ละ request (รวม SSE ที่ค้างไว้) ได้ thread ของตัวเอง
+    sample.run(host="0.0.0.0", port=8080, threaded=True)
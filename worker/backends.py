@@ -0,0 +1,33 @@
+import os
+
+import router_client
+import ssh_client
+
+BACKENDS = {"ansible": router_client, "ssh": ssh_client}
+
+
+def _parse_overrides(raw):
+    """แปลง 'backup=ssh,configure_dns=ssh' เป็น dict {job_type: backend}"""
+    overrides = {}
+    for item in raw.split(","):
+        if "=" in item:
+            job_type, backend = item.split("=", 1)
+            overrides[job_type.strip()] = backend.strip()
+    return overrides
+
+
+DEFAULT_BACKEND = os.getenv("ROUTER_BACKEND", "ansible")
+BACKEND_OVERRIDES = _parse_overrides(os.getenv("ROUTER_BACKEND_OVERRIDES", ""))
+
+
+def get_client(job_type):
+    """เลือกโมดูลที่ใช้รันงาน (ansible หรือ ssh) ตาม job_type"""
+    name = BACKEND_OVERRIDES.get(job_type, DEFAULT_BACKEND)
+    client = BACKENDS.get(name, router_client)
+    if client is ssh_client and job_type not in ssh_client.SUPPORTED_JOBS:
+        return router_client
+    return client
+
+
+def uses_ssh(job_type):
+    return get_client(job_type) is ssh_client
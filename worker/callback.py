@@ -1,50 +1,76 @@
-import json
-from router_client import (
-    get_interfaces,
-    backup_config,
-    restore_config,
-    configure_interface,
-    configure_dns,
-    configure_dhcp,
-    delete_dhcp_pool,
-    delete_dns,
-    save_config,
-    configure_acl,
-    delete_acl,
-)
+import contextlib
+import os
+from backends import get_client, uses_ssh
 from database import save_interface_status, save_backup_config
+from session_pool import pool
 
+POLL_BATCH_FORKS = int(os.getenv("POLL_BATCH_FORKS", "10"))
+# "replace" = configure replace ทั้งไฟล์, "incremental" = ส่งเฉพาะส่วนต่างจาก running-config
+RESTORE_MODE = os.getenv("RESTORE_MODE", "replace")
 
-def callback(ch, method, props, body):
-    job = json.loads(body.decode())
+
+def handle_poll_batch(job):
+    """งาน poll แบบกลุ่ม: รันครั้งเดียวกับหลายเราเตอร์แล้วบันทึกผลแยกตาม router"""
+    routers = job["routers"]
+    forks = job.get("forks", POLL_BATCH_FORKS)
+    print(f"Received batch poll for {len(routers)} routers (forks={forks})")
+
+    outputs, failures = get_client("check_interface_batch").get_interfaces_batch(
+        routers, forks=forks
+    )
+    for router_ip, output in outputs.items():
+        save_interface_status(router_ip, output)
+    for router_ip, reason in failures.items():
+        print(f" Batch poll failed for {router_ip}: {reason}")
+    print(f"Stored interface status for {len(outputs)} routers")
+
+
+def handle_job(job, refresh=True):
+    """รันงานหนึ่งงาน คืน True ถ้างานนี้แก้ config (ต้อง refresh) และ refresh=False ให้ผู้เรียกจัดการ refresh เอง"""
     # กำหนดค่าเริ่มต้นให้เป็น 'check_interface' ถ้าไม่มี job_type ส่งมา
     job_type = job.get("job_type", "check_interface")
 
+    if job_type == "check_interface_batch":
+        handle_poll_batch(job)
+        return False
+
     router_ip = job["ip"]
     router_username = job["user"]
     router_password = job["password"]
 
     print(f"Received job '{job_type}' for router {router_ip}")
+    client = get_client(job_type)
 
     # --- 1. เพิ่ม Flag สำหรับตรวจสอบว่าต้อง Refresh ข้อมูลหรือไม่ ---
     needs_refresh = False
 
     try:
         if job_type == "check_interface":
-            output = get_interfaces(router_ip, router_username, router_password)
+            output = client.get_interfaces(router_ip, router_username, router_password)
             save_interface_status(router_ip, output)
             print(f"Stored interface status for {router_ip}")
 
         elif job_type == "backup":
-            output = backup_config(router_ip, router_username, router_password)
+            output = client.backup_config(router_ip, router_username, router_password)
             save_backup_config(router_ip, output)
             print(f"Stored backup config for {router_ip}")
 
         elif job_type == "restore":
             config_text = job.get("config")
             if config_text:
-                restore_config(router_ip, router_username, router_password, config_text)
-                print(f"Successfully sent restore job for {router_ip}")
+                restore_mode = job.get("restore_mode") or RESTORE_MODE
+                if restore_mode == "incremental":
+                    result = client.restore_config_incremental(
+                        router_ip, router_username, router_password, config_text
+                    )
+                else:
+                    result = client.restore_config(
+                        router_ip, router_username, router_password, config_text
+                    )
+                print(
+                    f"Successfully sent restore job for {router_ip} "
+                    f"({restore_mode}: {result})"
+                )
                 needs_refresh = True  # <--- ตั้งค่า Flag
 
         elif job_type == "configure_interface":
@@ -53,7 +79,7 @@ def callback(ch, method, props, body):
             ip_address = job.get("ip_address")
             subnet_prefix = job.get("subnet_prefix")
 
-            configure_interface(
+            client.configure_interface(
                 router_ip,
                 router_username,
                 router_password,
@@ -69,21 +95,25 @@ def callback(ch, method, props, body):
 
         elif job_type == "configure_dns":
             dns_servers = job.get("dns_servers", [])
-            configure_dns(router_ip, router_username, router_password, dns_servers)
+            client.configure_dns(
+                router_ip, router_username, router_password, dns_servers
+            )
             print(f"Successfully sent DNS config job for {router_ip}")
             needs_refresh = True  # <--- ตั้งค่า Flag
 
         elif job_type == "delete_dns":
             dns_server = job.get("dns_server")
             if dns_server:
-                delete_dns(router_ip, router_username, router_password, dns_server)
+                client.delete_dns(
+                    router_ip, router_username, router_password, dns_server
+                )
                 print(
                     f"Successfully sent delete job for DNS server {dns_server} on {router_ip}"
                 )
                 needs_refresh = True  # <--- ตั้งค่า Flag
 
         elif job_type == "configure_dhcp":
-            configure_dhcp(
+            client.configure_dhcp(
                 router_ip,
                 router_username,
                 router_password,
@@ -100,20 +130,22 @@ def callback(ch, method, props, body):
 
         elif job_type == "delete_dhcp_pool":
             pool_name = job.get("pool_name")
-            delete_dhcp_pool(router_ip, router_username, router_password, pool_name)
+            client.delete_dhcp_pool(
+                router_ip, router_username, router_password, pool_name
+            )
             print(
                 f"Successfully sent delete job for DHCP pool {pool_name} on {router_ip}"
             )
             needs_refresh = True  # <--- ตั้งค่า Flag
 
         elif job_type == "save_config":
-            save_config(router_ip, router_username, router_password)
+            client.save_config(router_ip, router_username, router_password)
             print(f"Successfully sent save configuration job for {router_ip}")
             # การ Save ไม่เปลี่ยน running-config แต่ถ้าอยากให้ Refresh ด้วยก็เปิดบรรทัดล่าง
             # needs_refresh = True
 
         elif job_type == "configure_acl":
-            configure_acl(
+            client.configure_acl(
                 router_ip,
                 router_username,
                 router_password,
@@ -128,7 +160,9 @@ def callback(ch, method, props, body):
         elif job_type == "delete_acl":
             acl_number = job.get("acl_number")
             if acl_number:
-                delete_acl(router_ip, router_username, router_password, acl_number)
+                client.delete_acl(
+                    router_ip, router_username, router_password, acl_number
+                )
                 print(
                     f"Successfully sent delete job for ACL {acl_number} on {router_ip}"
                 )
@@ -136,14 +170,36 @@ def callback(ch, method, props, body):
 
     except Exception as e:
         print(f" Error: {e}")
-        needs_refresh = False  # <--- ถ้า Error, ให้ข้ามการ Refresh
+        # ส่ง error ต่อให้ consumer ตัดสินว่าจะ retry หรือส่งเข้า DLQ (และข้ามการ Refresh)
+        raise
 
     # --- 2. ส่วนที่เพิ่มเข้ามา: ตรวจสอบ Flag และสั่ง Refresh ข้อมูล ---
-    if needs_refresh:
-        try:
-            print(f"Post-config refresh: Running 'check_interface' for {router_ip}")
-            output = get_interfaces(router_ip, router_username, router_password)
-            save_interface_status(router_ip, output)
-            print(f"Post-config refresh: Stored interface status for {router_ip}")
-        except Exception as e:
-            print(f" Post-config refresh FAILED: {e}")
+    if needs_refresh and refresh:
+        refresh_interfaces(job)
+    return needs_refresh
+
+
+def refresh_interfaces(job, raise_errors=False):
+    """ดึงสถานะ interface ใหม่หลังแก้ config แล้วบันทึกทันทีให้หน้าเว็บเห็น"""
+    router_ip = job["ip"]
+    try:
+        print(f"Post-config refresh: Running 'check_interface' for {router_ip}")
+        output = get_client("check_interface").get_interfaces(
+            router_ip, job["user"], job["password"]
+        )
+        save_interface_status(router_ip, output, flush=True)
+        print(f"Post-config refresh: Stored interface status for {router_ip}")
+    except Exception as e:
+        print(f" Post-config refresh FAILED: {e}")
+        if raise_errors:
+            raise
+
+
+def pinned_session(jobs):
+    """ให้งานหลายงานของเราเตอร์เดียวกันใช้ SSH session เดียว (เฉพาะงานที่ใช้ backend ssh)"""
+    job = jobs[0]
+    if len(jobs) < 2 or "ip" not in job:
+        return contextlib.nullcontext()
+    if not any(uses_ssh(j.get("job_type", "check_interface")) for j in jobs):
+        return contextlib.nullcontext()
+    return pool.pinned(job["ip"], job["user"], job["password"])
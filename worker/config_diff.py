@@ -0,0 +1,167 @@
+"""เปรียบเทียบ config ของ Cisco IOS แบบแยกตาม section แล้วสร้างชุดคำสั่งที่เปลี่ยนเฉพาะส่วนต่าง"""
+
+# บรรทัดที่เปลี่ยนทุกครั้งแม้ config ไม่ได้เปลี่ยน ไม่นำมาเปรียบเทียบ
+VOLATILE_PREFIXES = (
+    "Building configuration",
+    "Current configuration :",
+    "! Last configuration change",
+    "! NVRAM config last updated",
+    "ntp clock-period",
+)
+# interface ที่สร้าง/ลบได้ ส่วน interface จริงใช้ 'default interface' แทน 'no interface'
+VIRTUAL_INTERFACES = ("Loopback", "Tunnel", "Vlan", "Port-channel", "BDI", "Virtual")
+# section ที่ลำดับบรรทัดข้างในมีผล (แก้ทีละบรรทัดไม่ได้ ต้องสร้างใหม่ทั้ง section)
+ORDERED_SECTIONS = ("ip access-list ", "ipv6 access-list ")
+# ตัวปิด banner ตัวอักษรเดียวที่ใช้ตอนส่งคำสั่ง (เลือกตัวแรกที่ไม่มีในข้อความ)
+BANNER_DELIMITERS = "#%~@&|"
+
+
+def _banner_delimiter(line):
+    """ตัวปิดของ banner เช่น 'banner motd ^CHello^C' -> '^C'"""
+    parts = line.split(" ", 2)
+    body = parts[2] if len(parts) > 2 else ""
+    return body[:2] if body.startswith("^") else body[:1]
+
+
+def banner_command(block):
+    """banner จาก running-config เป็นคำสั่งเดียว (หลายบรรทัด) ที่ใช้ตัวปิดตัวอักษรเดียว
+
+    running-config แสดงตัวปิดเป็น '^C' ถ้าพิมพ์กลับไปตรง ๆ IOS จะถือ '^' เป็นตัวปิดแล้วรอข้อความต่อ
+    """
+    parts = block.split(" ", 2)
+    delimiter = _banner_delimiter(block)
+    body = (parts[2] if len(parts) > 2 else "").removeprefix(delimiter)
+    body = body.rpartition(delimiter)[0] if delimiter in body else body
+    new_delimiter = next((c for c in BANNER_DELIMITERS if c not in body), None)
+    if new_delimiter is None:
+        raise ValueError(f"No usable delimiter for banner {parts[1]}")
+    return f"banner {parts[1]} {new_delimiter}{body}{new_delimiter}"
+
+
+def parse_config(config_text):
+    """แปลง config เป็นต้นไม้ {บรรทัด: {บรรทัดลูก: ...}} ตามการย่อหน้า (เรียงตามลำดับเดิม)"""
+    root = {}
+    stack = [(-1, root)]
+    lines = iter(config_text.replace("\r\n", "\n").split("\n"))
+    for raw in lines:
+        line = raw.rstrip()
+        stripped = line.strip()
+        if not stripped or stripped.startswith("!") or stripped == "end":
+            continue
+        if stripped.startswith(VOLATILE_PREFIXES):
+            continue
+
+        if stripped.startswith("banner "):
+            # banner หลายบรรทัดนับเป็นหนึ่งรายการ (ข้อความข้างในไม่ใช่คำสั่ง)
+            delimiter = _banner_delimiter(stripped)
+            block = [stripped]
+            opened = stripped.split(" ", 2)[-1].removeprefix(delimiter)
+            while delimiter and delimiter not in opened:
+                opened = next(lines, delimiter).rstrip()
+                block.append(opened)
+            stack = [(-1, root)]
+            root["\n".join(block)] = {}
+            continue
+
+        depth = len(line) - len(line.lstrip(" "))
+        while stack[-1][0] >= depth:
+            stack.pop()
+        children = stack[-1][1].setdefault(stripped, {})
+        stack.append((depth, children))
+    return root
+
+
+def negate(line):
+    """คำสั่งที่ยกเลิกบรรทัดนี้"""
+    if line.startswith("no "):
+        return line[3:]
+    if line.startswith("banner "):
+        return "no " + " ".join(line.split()[:2])
+    if line.startswith("interface "):
+        name = line.split(" ", 1)[1]
+        if "." not in name and not name.startswith(VIRTUAL_INTERFACES):
+            return "default " + line
+    return "no " + line
+
+
+def _numbered_acls(tree):
+    """{'access-list 10': [บรรทัดตามลำดับ]} ของ ACL แบบตัวเลขที่อยู่ระดับบนสุด"""
+    acls = {}
+    for line in tree:
+        if line.startswith("access-list "):
+            acls.setdefault(" ".join(line.split()[:2]), []).append(line)
+    return acls
+
+
+def _acl_lines(running, target):
+    """ACL แบบตัวเลข: ลำดับบรรทัดมีผลและ 'no access-list N ...' ลบทั้งชุด จึงจัดการทีละ ACL"""
+    running_acls = _numbered_acls(running)
+    target_acls = _numbered_acls(target)
+    lines = ["no " + name for name in running_acls if name not in target_acls]
+    for name, acl_lines in target_acls.items():
+        if running_acls.get(name) == acl_lines:
+            continue
+        if name in running_acls:
+            lines.append("no " + name)
+        lines.extend(acl_lines)
+    return lines
+
+
+def _replaced_by_target(line, target):
+    """'no X' ที่ target มีคำสั่ง X อยู่แล้ว (เช่น 'no ip address' กับ 'ip address <ip> <mask>')
+
+    การเพิ่มคำสั่งใน target ก็แทนที่ 'no X' อยู่แล้ว ถ้ากลับเป็น 'X' เฉย ๆ จะได้คำสั่งที่ไม่ครบ
+    """
+    if not line.startswith("no "):
+        return False
+    command = line[3:]
+    return any(other == command or other.startswith(command + " ") for other in target)
+
+
+def _delta(running, target, path, blocks):
+    lines = []
+    if not path:
+        lines += _acl_lines(running, target)
+        running = {k: v for k, v in running.items() if not k.startswith("access-list ")}
+        target = {k: v for k, v in target.items() if not k.startswith("access-list ")}
+
+    # ลบก่อนเพิ่ม เช่น 'no ip address <เก่า>' ต้องมาก่อน 'ip address <ใหม่>'
+    lines += [
+        negate(line)
+        for line in running
+        if line not in target and not _replaced_by_target(line, target)
+    ]
+    for line, children in target.items():
+        existing = running.get(line)
+        if existing is None and not children:
+            lines.append(line)
+        elif existing and line.startswith(ORDERED_SECTIONS):
+            if list(existing) != list(children):
+                # ACL แบบมีชื่อ: ลำดับ entry มีผล ลบแล้วสร้าง section ใหม่ทั้งหมด
+                lines.append(negate(line))
+                running = dict(running)
+                running[line] = {}
+    if lines:
+        blocks.append((path, list(dict.fromkeys(lines))))
+    for line, children in target.items():
+        # section ที่ target ไม่เหลือบรรทัดลูกแล้วก็ต้องลบบรรทัดลูกเดิมออก
+        if children or running.get(line):
+            _delta(running.get(line) or {}, children, path + (line,), blocks)
+
+
+def config_delta(running_text, target_text):
+    """คำสั่งที่ทำให้ running-config กลายเป็น target (ใช้ใน configure terminal)
+
+    ทุกช่วงคำสั่งจะขึ้นต้นด้วยบรรทัดหัวของ section ที่อยู่ (เช่น 'interface Gi1') เพื่อให้อยู่ใน mode ที่ถูกต้องเสมอ
+    banner เป็นคำสั่งเดียวที่มีหลายบรรทัด ต้องส่งทั้งก้อนในครั้งเดียว
+    """
+    blocks = []
+    _delta(parse_config(running_text), parse_config(target_text), (), blocks)
+    commands = []
+    for path, lines in blocks:
+        commands.extend(path)
+        for line in lines:
+            commands.append(
+                banner_command(line) if line.startswith("banner ") else line
+            )
+    return commands
@@ -1,10 +1,218 @@
+import collections
+import functools
+import json
 import os
 import time
+from datetime import datetime, UTC
 import pika
-from callback import callback
+from callback import handle_job, pinned_session, refresh_interfaces
+from database import save_job_status
+from executor import KeyedExecutor
+from metrics import LaneMetrics
+import retry
 
 user = os.getenv("RABBITMQ_DEFAULT_USER")
 pwd = os.getenv("RABBITMQ_DEFAULT_PASS")
+# จำนวนงานที่ worker หนึ่งตัวรันพร้อมกันได้ (= prefetch_count)
+concurrency = max(1, int(os.getenv("WORKER_CONCURRENCY", "1")))
+# thread ที่กันไว้ให้งานจากหน้าเว็บ ไม่ต้องรองาน poll ที่รันอยู่
+interactive_concurrency = max(1, int(os.getenv("INTERACTIVE_CONCURRENCY", "2")))
+QUEUE = "router_jobs"
+# งานที่ผู้ใช้กดจากหน้าเว็บ (backup, restore, config) แยกคิวจากงาน poll ของ scheduler
+INTERACTIVE_QUEUE = "router_jobs.interactive"
+# lane -> (queue, prefetch, priority, durable) ตัวเลข priority น้อยได้รันก่อน
+# คิว interactive เป็น durable (งานของผู้ใช้ต้องไม่หายตอน RabbitMQ restart) ส่วน router_jobs คงเดิม
+# (ประกาศ durable ทับคิวเดิมไม่ได้ และงาน poll ที่หายไป scheduler จะส่งใหม่รอบถัดไปอยู่แล้ว)
+LANES = {
+    "interactive": (INTERACTIVE_QUEUE, interactive_concurrency, 0, True),
+    "poll": (QUEUE, concurrency, 1, False),
+}
+metrics = LaneMetrics(float(os.getenv("LANE_METRICS_INTERVAL", "60")))
+# fanout exchange สำหรับแจ้งว่างานเสร็จแล้ว
+RESULTS_EXCHANGE = "poll_results"
+
+
+def record_status(job, status, **fields):
+    """อัปเดตสถานะงานใน CouchDB (เฉพาะงานที่มี job_id เช่นงานจากหน้าเว็บ)"""
+    job_id = job.get("job_id")
+    if not job_id:
+        return
+    try:
+        save_job_status(
+            job_id,
+            status,
+            job_type=job.get("job_type", "check_interface"),
+            router_ip=job.get("ip"),
+            **fields,
+        )
+    except Exception as e:
+        print(f" Could not record status '{status}' for job {job_id}: {e}")
+
+
+def check_job(job):
+    """ตรวจโครงของ job ก่อนส่งเข้า executor (JSON ที่ถูกต้องแต่ไม่ใช่ object ก็ถือว่าเป็นข้อความเสีย)"""
+    if not isinstance(job, dict):
+        raise TypeError(f"job must be an object, got {type(job).__name__}")
+    if job.get("job_type") == "check_interface_batch":
+        routers = job.get("routers")
+        if not isinstance(routers, list) or not all(
+            isinstance(router, dict) for router in routers
+        ):
+            raise TypeError("routers must be a list of objects")
+
+
+def job_key(job):
+    """key ที่ใช้ serialize งาน: router ip หรือ tuple ของทุก ip สำหรับงาน poll แบบกลุ่ม
+
+    executor จองทุก ip ใน tuple งานกลุ่มจึงไม่รันซ้อนกับงานอื่นของเราเตอร์ในกลุ่ม
+    """
+    if job.get("job_type") == "check_interface_batch":
+        return tuple(sorted({router["ip"] for router in job["routers"]}))
+    return job["ip"]
+
+
+def job_ips(job):
+    if job.get("job_type") == "check_interface_batch":
+        return [router["ip"] for router in job["routers"]]
+    return [job["ip"]]
+
+
+def publish_result(ch, job, status):
+    """แจ้งผลของงานผ่าน fanout exchange (scheduler ใช้ปลดสถานะ pending ของการ poll)"""
+    event = {
+        "ips": job_ips(job),
+        "job_type": job.get("job_type", "check_interface"),
+        "status": status,
+        "finished_at": datetime.now(UTC).isoformat(),
+    }
+    ch.basic_publish(
+        exchange=RESULTS_EXCHANGE, routing_key="", body=json.dumps(event).encode()
+    )
+
+
+def finish_succeeded(ch, delivery_tag, job):
+    """ทำงานบน thread ของ connection: แจ้งผลแล้ว ack"""
+    publish_result(ch, job, "succeeded")
+    ch.basic_ack(delivery_tag)
+
+
+def finish_failed(ch, delivery_tag, queue, body, job, action, attempt, error):
+    """ทำงานบน thread ของ connection: ส่งงานเข้า delay queue หรือ DLQ แล้วค่อย ack"""
+    if action == "retrying":
+        retry.publish_retry(ch, queue, body, attempt, error)
+    elif action == "failed":
+        retry.publish_dead_letter(ch, queue, body, attempt, error)
+    publish_result(ch, job, action)
+    ch.basic_ack(delivery_tag)
+
+
+def queue_wait(job, attempt, received_at):
+    """เวลาที่งานรอตั้งแต่ถูกส่งเข้าคิวจนเริ่มรัน (งานที่ retry นับจากตอนที่ได้รับรอบนี้)"""
+    enqueued_at = job.get("enqueued_at")
+    if attempt or not isinstance(enqueued_at, (int, float)):
+        enqueued_at = received_at
+    return time.time() - enqueued_at
+
+
+# ข้อความหนึ่งข้อความจาก RabbitMQ พร้อมงานที่ parse แล้ว
+Delivery = collections.namedtuple(
+    "Delivery", "conn ch lane method props body job received_at"
+)
+# key ที่ยังค้าง refresh หลังแก้ config (เลื่อนไปทำหลังงานถัดไปของเราเตอร์เดียวกัน)
+_owed_refresh = set()
+
+
+def run_job(delivery, handler=handle_job):
+    """รันงานใน thread ของ executor แล้วค่อย ack กลับบน thread ของ connection (คืนค่าที่ handler คืน)"""
+    conn, ch, lane, method, props, body, job, received_at = delivery
+    attempt = retry.get_attempt(props)
+    wait = queue_wait(job, attempt, received_at)
+    metrics.record(lane, wait)
+    record_status(job, "running", attempt=attempt, wait_seconds=round(wait, 3))
+    try:
+        result = handler(job)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        action = retry.failure_action(job, attempt)
+        print(f" Error ({action}, attempt {attempt}): {error}")
+        if action == "retrying":
+            record_status(
+                job,
+                action,
+                attempt=attempt,
+                error=error,
+                retry_in=retry.retry_delay(attempt),
+            )
+        else:
+            record_status(job, action, attempt=attempt, error=error)
+        conn.add_callback_threadsafe(
+            functools.partial(
+                finish_failed,
+                ch,
+                method.delivery_tag,
+                LANES[lane][0],
+                body,
+                job,
+                action,
+                attempt,
+                error,
+            )
+        )
+        return None
+
+    record_status(job, "succeeded", attempt=attempt)
+    conn.add_callback_threadsafe(
+        functools.partial(finish_succeeded, ch, method.delivery_tag, job)
+    )
+    return result
+
+
+def finish_coalesced(delivery):
+    """งานที่ถูกรวมเข้ากับงานอื่นในกลุ่มเดียวกัน ไม่ต้องรันซ้ำ แค่ ack"""
+    metrics.record(delivery.lane, time.time() - delivery.received_at)
+    record_status(delivery.job, "succeeded", coalesced=True)
+    delivery.conn.add_callback_threadsafe(
+        functools.partial(
+            finish_succeeded, delivery.ch, delivery.method.delivery_tag, delivery.job
+        )
+    )
+
+
+def is_poll(job):
+    return job.get("job_type", "check_interface") == "check_interface"
+
+
+def run_group(executor, key, deliveries):
+    """รันงานที่รอเราเตอร์เดียวกันอยู่เป็นกลุ่ม
+
+    - งาน config รันต่อกันบน SSH session เดียว และไม่ refresh ทีละงาน
+    - งาน poll ที่ค้างหลายงานรันแค่ครั้งเดียว และใช้เป็น refresh หลัง config ไปด้วย
+    - ถ้ายังมีงานของเราเตอร์นี้รอต่อ (เช่น edit_dhcp ที่ส่ง delete แล้ว create) เลื่อน refresh ไปทำทีเดียวตอนท้าย
+    """
+    polls = [d for d in deliveries if is_poll(d.job)]
+    others = [d for d in deliveries if not is_poll(d.job)]
+    if len(deliveries) > 1:
+        print(f"Coalescing {len(deliveries)} jobs for {key} ({len(polls)} polls)")
+
+    needs_refresh = key in _owed_refresh
+    _owed_refresh.discard(key)
+    with pinned_session([d.job for d in deliveries]):
+        for delivery in others:
+            if run_job(delivery, functools.partial(handle_job, refresh=False)):
+                needs_refresh = True
+
+        if polls:
+            handler = handle_job
+            if needs_refresh:
+                handler = functools.partial(refresh_interfaces, raise_errors=True)
+            run_job(polls[0], handler)
+            for delivery in polls[1:]:
+                finish_coalesced(delivery)
+        elif needs_refresh:
+            if executor.has_pending(key):
+                _owed_refresh.add(key)
+            else:
+                refresh_interfaces(others[-1].job)
 
 
 def consume(host):
@@ -24,10 +232,43 @@ def consume(host):
         print("Could not connect after 10 attempts")
         exit(1)
 
-    ch = conn.channel()
-    ch.queue_declare(queue="router_jobs")
-    ch.basic_qos(prefetch_count=1)
-    ch.basic_consume(queue="router_jobs", on_message_callback=callback, auto_ack=True)
+    executor = KeyedExecutor(
+        interactive_concurrency + concurrency,
+        run_group=lambda key, deliveries: run_group(executor, key, deliveries),
+    )
+    metrics.start()
+
+    def on_message(lane, ch, method, props, body):
+        queue, _, priority, _ = LANES[lane]
+        received_at = time.time()
+        try:
+            job = json.loads(body.decode())
+            check_job(job)
+            key = job_key(job)
+        except (ValueError, KeyError, TypeError) as e:
+            # ข้อความเสีย (poisoned) retry ไปก็ไม่หาย ส่งเข้า DLQ เลย
+            print(f" Dead-lettering malformed job: {e}")
+            retry.publish_dead_letter(ch, queue, body, 0, f"malformed: {e}")
+            ch.basic_ack(method.delivery_tag)
+            return
+        executor.submit(
+            key,
+            Delivery(conn, ch, lane, method, props, body, job, received_at),
+            priority=priority,
+        )
+
+    for lane, (queue, prefetch, _, durable) in LANES.items():
+        # แยก channel ต่อ lane เพื่อให้ prefetch ของแต่ละคิวไม่แย่งกัน
+        ch = conn.channel()
+        ch.queue_declare(queue=queue, durable=durable)
+        retry.declare_queues(ch, queue)
+        ch.exchange_declare(exchange=RESULTS_EXCHANGE, exchange_type="fanout")
+        ch.basic_qos(prefetch_count=prefetch)
+        ch.basic_consume(
+            queue=queue, on_message_callback=functools.partial(on_message, lane)
+        )
+        print(f"Consuming '{queue}' ({lane}) with concurrency={prefetch}")
+    # start_consuming ของ channel ใดก็ได้จะวน event loop ของทั้ง connection
     ch.start_consuming()
 
 
@@ -1,21 +1,234 @@
 from datetime import datetime, UTC
+import atexit
+import base64
+import gzip
+import hashlib
+import itertools
+import json
 import os
+import threading
+import time
+import uuid
 import couchdb
+import couchdb.http
+from config_diff import VOLATILE_PREFIXES
+from ios_parsers import PARSER_VERSION, parse_snapshot
 
+_lock = threading.RLock()
+_server = None
+_dbs = {}
 
-def save_interface_status(router_ip, status_data):
-    couchdb_uri = os.getenv("COUCHDB_URI")
-    db_name = os.getenv("INTERFACE_DB_NAME")
 
-    server = couchdb.Server(couchdb_uri)
+def get_server():
+    """Server ตัวเดียวต่อ process; Session ของ couchdb เก็บ connection แบบ keep-alive ไว้ใช้ซ้ำ"""
+    global _server
+    with _lock:
+        if _server is None:
+            session = couchdb.http.Session(
+                timeout=float(os.getenv("COUCHDB_TIMEOUT", "30")),
+                retry_delays=[1, 2, 4],
+            )
+            _server = couchdb.Server(os.getenv("COUCHDB_URI"), session=session)
+        return _server
+
+
+def get_db(db_name):
+    """คืน handle ของ database (สร้าง database แค่ครั้งแรกที่ใช้)"""
+    db = _dbs.get(db_name)
+    if db is not None:
+        return db
+    with _lock:
+        if db_name not in _dbs:
+            server = get_server()
+            try:
+                _dbs[db_name] = server[db_name]
+            except couchdb.ResourceNotFound:
+                try:
+                    _dbs[db_name] = server.create(db_name)
+                except couchdb.PreconditionFailed:
+                    # worker ตัวอื่นสร้างไปก่อนแล้ว
+                    _dbs[db_name] = server[db_name]
+        return _dbs[db_name]
+
+
+class BulkWriter:
+    """บัฟเฟอร์เอกสารแล้วเขียนทีละหลายฉบับผ่าน _bulk_docs เมื่อครบจำนวนหรือครบเวลา
+
+    เอกสารที่มี _id ซ้ำกับที่ยังค้างในบัฟเฟอร์จะทับฉบับเก่า (เขียนแค่ฉบับล่าสุด)
+    on_error(doc, error) ถูกเรียกเมื่อ CouchDB ปฏิเสธเอกสาร (เช่น conflict)
+    """
+
+    def __init__(self, db_name, max_docs, max_delay, on_error=None):
+        self.db_name = db_name
+        self.max_docs = max_docs
+        self.max_delay = max_delay
+        self.on_error = on_error
+        self._docs = {}
+        self._seq = itertools.count()
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def _key(self, doc):
+        return doc.get("_id") or f"#{next(self._seq)}"
+
+    def pending(self, doc_id):
+        """เอกสารที่ยังค้างในบัฟเฟอร์ (ยังไม่ได้เขียนลง DB) หรือ None"""
+        with self._lock:
+            return self._docs.get(doc_id)
+
+    def add(self, doc):
+        with self._lock:
+            if not self._docs:
+                self._oldest = time.monotonic()
+            self._docs[self._key(doc)] = doc
+            full = len(self._docs) >= self.max_docs
+        self._start_flusher()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._docs = self._docs, {}
+            self._oldest = None
+        if not pending:
+            return 0
+        docs = list(pending.values())
+        try:
+            results = get_db(self.db_name).update(docs)
+        except Exception as e:
+            print(f" Bulk write of {len(docs)} docs to {self.db_name} failed: {e}")
+            limit = self.max_docs * 10
+            with self._lock:
+                # เก็บกลับเข้าบัฟเฟอร์ (ฉบับที่ใหม่กว่าชนะ, จำกัดขนาดไว้ไม่ให้โตไม่รู้จบตอน DB ล่ม)
+                pending.update(self._docs)
+                keys = list(pending)[-limit:]
+                self._docs = {key: pending[key] for key in keys}
+                self._oldest = self._oldest or time.monotonic()
+            return 0
+        failed = 0
+        for doc, (ok, _, error) in zip(docs, results):
+            if ok:
+                continue
+            failed += 1
+            if self.on_error:
+                self.on_error(doc, error)
+        if failed:
+            print(f" Bulk write to {self.db_name}: {failed} docs rejected")
+        return len(docs) - failed
+
+    def _start_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_forever, daemon=True)
+            self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(max(0.1, self.max_delay / 4))
+            oldest = self._oldest
+            if oldest is not None and time.monotonic() - oldest >= self.max_delay:
+                self.flush()
+
+
+# ฟิลด์ที่ใช้คำนวณ hash ของ snapshot (ไม่รวม timestamp)
+SNAPSHOT_FIELDS = (
+    "interfaces",
+    "dns_servers",
+    "dhcp_config_raw",
+    "acl_config_raw",
+    "interface_detail_raw",
+)
+# จำนวนครั้งที่ลองเขียน current:<ip> ใหม่เมื่อชนกับ worker ตัวอื่น
+CURRENT_RETRIES = 3
+
+
+def current_doc_id(router_ip):
+    return f"current:{router_ip}"
+
+
+def snapshot_hash(data):
+    content = {field: data[field] for field in SNAPSHOT_FIELDS}
+    # parser เวอร์ชันใหม่ = hash ใหม่ snapshot จะถูกเขียนใหม่พร้อมผล parse ที่อัปเดตแล้ว
+    content["parser_version"] = PARSER_VERSION
+    encoded = json.dumps(content, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def _merge_current(latest, ours):
+    """รวม current doc ที่ worker ตัวอื่นเขียนไปแล้ว (latest) กับของเรา (ours) ที่ชนกัน
+
+    last_seen เอาค่าที่ใหม่กว่า ส่วน snapshot ใช้ของฝั่งที่เห็นเนื้อหาเปลี่ยนทีหลัง
+    """
+    if latest is None:
+        return {k: v for k, v in ours.items() if k != "_rev"}
+    merged = dict(latest)
+    merged["last_seen"] = max(latest.get("last_seen", ""), ours.get("last_seen", ""))
+    if ours.get("snapshot_id") and ours.get("changed_at", "") > latest.get(
+        "changed_at", ""
+    ):
+        for field in ("content_hash", "snapshot_id", "changed_at"):
+            merged[field] = ours[field]
+    return merged
+
+
+def _retry_current(doc, error):
+    # current doc ชนกับ worker ตัวอื่น (rev เก่า): อ่านฉบับล่าสุด รวมการเปลี่ยนแปลงของเรา แล้วเขียนใหม่ทันที
+    if doc.get("doc_type") != "router_current" or not isinstance(
+        error, couchdb.ResourceConflict
+    ):
+        return
+    db = get_db(interface_writer.db_name)
+    for _ in range(CURRENT_RETRIES):
+        try:
+            db.save(_merge_current(db.get(doc["_id"]), doc))
+            return
+        except couchdb.ResourceConflict:
+            continue
+        except Exception as e:
+            print(f" Could not update {doc['_id']}: {e}")
+            return
+    print(f" Gave up updating {doc['_id']} after {CURRENT_RETRIES} conflicts")
+
+
+interface_writer = BulkWriter(
+    os.getenv("INTERFACE_DB_NAME", "interface_status"),
+    max_docs=int(os.getenv("INTERFACE_BULK_SIZE", "50")),
+    max_delay=float(os.getenv("INTERFACE_BULK_INTERVAL", "5")),
+    on_error=_retry_current,
+)
+atexit.register(interface_writer.flush)
+
+
+def _load_current(router_ip):
+    """current:<ip> ฉบับล่าสุด: ที่ยังค้างในบัฟเฟอร์ของ process นี้ ไม่งั้นอ่านจาก DB
+
+    ไม่ cache ข้ามรอบ poll เพราะ poll ของเราเตอร์เดียวกันไปลงที่ worker replica ไหนก็ได้
+    """
+    doc_id = current_doc_id(router_ip)
+    pending = interface_writer.pending(doc_id)
+    if pending is not None:
+        return pending
     try:
-        db = server[db_name]
-    except couchdb.ResourceNotFound:
-        db = server.create(db_name)
+        doc = get_db(interface_writer.db_name).get(doc_id)
+    except Exception as e:
+        print(f" Could not read current snapshot of {router_ip}: {e}")
+        return None
+    return dict(doc) if doc is not None else None
+
 
+def save_interface_status(router_ip, status_data, flush=False):
+    """เก็บผล poll เข้าบัฟเฟอร์ (flush=True ใช้ตอน refresh หลัง config ให้หน้าเว็บเห็นทันที)
+
+    เขียน snapshot ใหม่เฉพาะเมื่อเนื้อหาเปลี่ยน ถ้าเหมือนเดิมแค่อัปเดต last_seen ใน current:<ip>
+    """
+    now = datetime.now(UTC).isoformat()
     data = {
         "router_ip": router_ip,
-        "timestamp": datetime.now(UTC).isoformat(),
+        "timestamp": now,
         "interfaces": status_data.get("interfaces", []),
         "dns_servers": status_data.get("dns_servers", []),
         "dhcp_config_raw": status_data.get("dhcp_config_raw", ""),
@@ -23,24 +236,118 @@ def save_interface_status(router_ip, status_data):
         # vvvvthis one tell which int use which acl :)
         "interface_detail_raw": status_data.get("interface_detail_raw", ""),
     }
-    db.save(data)
+    content_hash = snapshot_hash(data)
+    current = _load_current(router_ip) or {
+        "_id": current_doc_id(router_ip),
+        # ไม่มี router_ip เพื่อไม่ให้ view snapshots/by_router_time นับเป็น snapshot
+        "doc_type": "router_current",
+        "ip": router_ip,
+    }
+    current = dict(current, last_seen=now)
+    if current.get("content_hash") != content_hash:
+        data["_id"] = uuid.uuid4().hex
+        data["content_hash"] = content_hash
+        # parse ครั้งเดียวตอนเนื้อหาเปลี่ยน หน้าเว็บอ่านผลไปแสดงได้เลย
+        try:
+            data["parsed"] = parse_snapshot(data)
+        except Exception as e:
+            # ไม่มี 'parsed' หน้าเว็บจะ parse เองจากข้อมูลดิบ
+            print(f" Could not parse snapshot of {router_ip}: {e}")
+        interface_writer.add(data)
+        current.update(
+            content_hash=content_hash, snapshot_id=data["_id"], changed_at=now
+        )
+    interface_writer.add(current)
+    if flush:
+        interface_writer.flush()
 
 
-def save_backup_config(router_ip, config_text):
-    """บันทึก config ที่ได้จากการ backup ลงใน DB"""
-    couchdb_uri = os.getenv("COUCHDB_URI")
-    # เราจะใช้ DB ใหม่ชื่อ 'router_backups'
-    db_name = os.getenv("BACKUP_DB_NAME", "router_backups")
+# backup เก็บแบบ content-addressed: blob:sha256:<hash> หนึ่งฉบับต่อเนื้อหา config ที่ไม่ซ้ำ (บีบอัดด้วย gzip)
+BLOB_ATTACHMENT = "config.gz"
+
+
+def normalize_config(config_text):
+    lines = []
+    for line in config_text.replace("\r\n", "\n").split("\n"):
+        line = line.rstrip()
+        if line.startswith(VOLATILE_PREFIXES):
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip() + "\n"
+
+
+def config_hash(config_text):
+    return hashlib.sha256(normalize_config(config_text).encode("utf-8")).hexdigest()
 
-    server = couchdb.Server(couchdb_uri)
+
+def blob_id(digest):
+    return f"blob:sha256:{digest}"
+
+
+def save_config_blob(db, config_text, now):
+    """เก็บ config เป็น blob ถ้ายังไม่มี ถ้ามีแล้วแค่อัปเดต last_used (กัน retention ลบระหว่างใช้)"""
+    digest = config_hash(config_text)
+    existing = db.get(blob_id(digest))
+    if existing is not None:
+        existing["last_used"] = now
+        try:
+            db.save(existing)
+        except couchdb.ResourceConflict:
+            # worker ตัวอื่นอัปเดตไปพร้อมกัน
+            pass
+        return digest
+
+    raw = config_text.encode("utf-8")
+    compressed = gzip.compress(raw)
+    doc = {
+        "_id": blob_id(digest),
+        "doc_type": "config_blob",
+        "size": len(raw),
+        "compressed_size": len(compressed),
+        "created_at": now,
+        "last_used": now,
+        "_attachments": {
+            BLOB_ATTACHMENT: {
+                "content_type": "application/gzip",
+                "data": base64.b64encode(compressed).decode("ascii"),
+            }
+        },
+    }
     try:
-        db = server[db_name]
-    except couchdb.ResourceNotFound:
-        db = server.create(db_name)
+        db.save(doc)
+    except couchdb.ResourceConflict:
+        # เนื้อหาเดียวกันถูกเก็บไปพร้อมกันแล้ว
+        pass
+    return digest
+
+
+def save_backup_config(router_ip, config_text):
+    """บันทึก config ที่ได้จากการ backup ลงใน DB (record ชี้ไปที่ blob ที่ใช้ร่วมกัน)"""
+    # เราจะใช้ DB ใหม่ชื่อ 'router_backups'
+    db = get_db(os.getenv("BACKUP_DB_NAME", "router_backups"))
+    now = datetime.now(UTC).isoformat()
 
     data = {
         "router_ip": router_ip,
-        "timestamp": datetime.now(UTC).isoformat(),
-        "config": config_text,
+        "timestamp": now,
+        "config_hash": save_config_blob(db, config_text, now),
+        "size": len(config_text.encode("utf-8")),
     }
     db.save(data)
+
+
+def save_job_status(job_id, status, **fields):
+    """บันทึก/อัปเดตสถานะของงาน (queued, running, succeeded, retrying, failed) ลง DB"""
+    db = get_db(os.getenv("JOB_DB_NAME", "job_status"))
+
+    for _ in range(3):
+        doc = db.get(job_id) or {"_id": job_id}
+        doc.update(fields)
+        doc["status"] = status
+        doc["updated_at"] = datetime.now(UTC).isoformat()
+        try:
+            db.save(doc)
+            return
+        except couchdb.ResourceConflict:
+            # เอกสารถูกแก้พร้อมกัน (เช่น web เขียน 'queued') ลองใหม่
+            continue
@@ -0,0 +1,108 @@
+import heapq
+import itertools
+import queue
+import threading
+
+
+def key_parts(key):
+    """key หนึ่งตัว (router ip) หรือ tuple ของหลาย key (งาน poll แบบกลุ่ม ต้องจองทุก ip)"""
+    return key if isinstance(key, tuple) else (key,)
+
+
+class KeyedExecutor:
+    """Thread pool ที่รันงานพร้อมกันได้ แต่งานที่มี key เดียวกัน (router ip) จะรันทีละงานตามลำดับ
+
+    key เป็น tuple ได้ งานนั้นจะรันเมื่อไม่มีงานอื่นถือ key ใดในนั้นอยู่ (จองทุก key พร้อมกัน จึงไม่ deadlock)
+    งานที่ priority น้อยกว่าจะได้รันก่อน (เช่นงานจากหน้าเว็บแซงงาน poll) ถ้า priority เท่ากันรันตามลำดับที่ส่งเข้ามา
+    ถ้ากำหนด run_group งานทั้งหมดที่รอ key เดียวกันอยู่จะถูกส่งให้ run_group(key, tasks) ทีเดียว (รวมงานซ้ำได้)
+    """
+
+    def __init__(self, workers, run_group=None):
+        self.run_group = run_group
+        self._lock = threading.Lock()
+        self._ready = queue.PriorityQueue()
+        self._seq = itertools.count()
+        # งานที่ยังรันไม่ได้ (priority, seq, key, task) เรียงตามลำดับที่ควรได้รัน
+        self._waiting = []
+        self._active = set()
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(
+                target=self._work, name=f"job-worker-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key, task, priority=0):
+        item = (priority, next(self._seq), key, task)
+        with self._lock:
+            heapq.heappush(self._waiting, item)
+            ready = self._schedule()
+        for item in ready:
+            self._ready.put(item)
+
+    def _schedule(self):
+        """เลือกงานที่รอซึ่ง key ว่างทั้งหมดออกมารัน (เรียกขณะถือ lock)
+
+        key ที่งานก่อนหน้ายังรออยู่ถือว่าไม่ว่าง งานหลังจึงแซงงานที่รอ key เดียวกันไม่ได้
+        """
+        ready = []
+        blocked = set()
+        remaining = []
+        for item in sorted(self._waiting):
+            parts = key_parts(item[2])
+            if any(part in self._active or part in blocked for part in parts):
+                blocked.update(parts)
+                remaining.append(item)
+                continue
+            self._active.update(parts)
+            ready.append(item)
+        if ready:
+            heapq.heapify(remaining)
+            self._waiting = remaining
+        return ready
+
+    def _work(self):
+        while True:
+            _, _, key, task = self._ready.get()
+            try:
+                if self.run_group:
+                    self.run_group(key, [task] + self._drain(key))
+                else:
+                    task()
+            except Exception as e:
+                print(f" Unhandled error in job for {key}: {e}")
+            finally:
+                self._next(key)
+
+    def _drain(self, key):
+        """ดึงงานที่รอ key นี้ (key เดียวกันทุกตัว) ออกมา เรียงตาม priority แล้วตามลำดับที่ส่งเข้ามา
+
+        หยุดที่งานซึ่งต่อคิวหลังงานอื่นที่รอ key ใด key หนึ่งเดียวกันอยู่ (เช่นงานกลุ่ม) ไม่ให้แซงงานนั้น
+        """
+        parts = set(key_parts(key))
+        pending = []
+        with self._lock:
+            blocked = set()
+            for item in sorted(self._waiting):
+                item_parts = key_parts(item[2])
+                if item[2] == key and not blocked.intersection(item_parts):
+                    pending.append(item)
+                elif blocked.intersection(item_parts) or parts.intersection(item_parts):
+                    blocked.update(item_parts)
+            if pending:
+                taken = {item[1] for item in pending}
+                self._waiting = [item for item in self._waiting if item[1] not in taken]
+                heapq.heapify(self._waiting)
+        return [task for _, _, _, task in pending]
+
+    def has_pending(self, key):
+        with self._lock:
+            return any(item[2] == key for item in self._waiting)
+
+    def _next(self, key):
+        with self._lock:
+            self._active.difference_update(key_parts(key))
+            ready = self._schedule()
+        for item in ready:
+            self._ready.put(item)
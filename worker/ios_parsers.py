@@ -0,0 +1,152 @@
+"""แปลงผล show command ของ IOS (DHCP, ACL, interface) เป็นข้อมูลที่มีโครงสร้าง
+
+ไฟล์นี้มีสำเนาเหมือนกันทั้งใน worker (parse ตอนบันทึก snapshot) และ web (parse snapshot เก่าที่ยังไม่มีผล parse)
+parser แต่ละตัวอ่านข้อมูลรอบเดียว (รับ str หรือ iterable ของบรรทัด เช่นอ่านทีละบรรทัดจากไฟล์/SSH ได้)
+และเลือกวิธีจัดการบรรทัดจากตัวอักษรแรก/prefix ก่อน ใช้ regex ที่ compile ไว้แล้วเฉพาะบรรทัดที่อาจตรงเท่านั้น
+"""
+
+import re
+
+# เพิ่มเลขนี้เมื่อผลลัพธ์ของ parser เปลี่ยน snapshot ที่ parse ด้วยเวอร์ชันเก่าจะถูก parse ใหม่
+PARSER_VERSION = 2
+
+DHCP_POOL_RE = re.compile(r"ip dhcp pool\s+(.+)")
+ACL_HEADER_RE = re.compile(r"(Standard|Extended) IP access list (\S+)")
+EXCLUDED_PREFIX = "ip dhcp excluded-address"
+POOL_PREFIX = "ip dhcp pool"
+INBOUND_MARKER = "Inbound  access list is "
+OUTBOUND_MARKER = "Outgoing access list is "
+
+
+def iter_lines(raw):
+    """รับข้อความทั้งก้อนหรือ iterable ของบรรทัด แล้วคืนทีละบรรทัด"""
+    if isinstance(raw, str):
+        return iter(raw.splitlines())
+    return (line.rstrip("\r\n") for line in raw)
+
+
+def parse_dhcp_pools(raw_config):
+    """
+    แปลง raw config string ของ DHCP ให้เป็น list of dictionaries
+    คืน (pools, excluded_addresses)
+    """
+    if not raw_config:
+        return [], []
+
+    pools = {}
+    excluded_addresses = []
+    current = None
+    for line in iter_lines(raw_config):
+        if line[:1] == " ":
+            # ค่า config ภายใน pool
+            if current is None:
+                continue
+            parts = line.split()
+            if not parts:
+                continue
+            key = parts[0]
+            if key == "network":
+                if len(parts) >= 3:
+                    current["network"] = f"{parts[1]} / {parts[2]}"
+            elif key == "default-router":
+                if len(parts) >= 2:
+                    current["default_router"] = parts[1]
+            elif key == "dns-server":
+                if len(parts) >= 2:
+                    current["dns_servers"] = " ".join(parts[1:])
+        elif line.startswith(EXCLUDED_PREFIX):
+            parts = line.split()
+            if len(parts) >= 4:
+                excluded_addresses.append(
+                    f"{parts[3]} - {parts[4] if len(parts) > 4 else ''}"
+                )
+        elif line.startswith(POOL_PREFIX):
+            match = DHCP_POOL_RE.match(line)
+            if match:
+                name = match.group(1).strip()
+                pools[name] = {"name": name}
+                current = pools[name] if name else None
+
+    return list(pools.values()), excluded_addresses
+
+
+def iter_acl_definitions(acl_raw):
+    """คืน (ชนิด, ชื่อ, [rules]) ของแต่ละ ACL จาก 'show ip access-lists' (standard และ extended)"""
+    current = None
+    for line in iter_lines(acl_raw):
+        if line[:1] == " ":
+            if current is not None:
+                current[2].append(line.strip())
+            continue
+        match = ACL_HEADER_RE.search(line)
+        if match:
+            if current is not None:
+                yield current
+            current = (match.group(1).lower(), match.group(2), [])
+    if current is not None:
+        yield current
+
+
+def iter_acl_bindings(interface_raw):
+    """คืน (interface, ชื่อ ACL, 'in'/'out') จาก 'show ip interface'"""
+    current_interface = None
+    for line in iter_lines(interface_raw):
+        if "line protocol is" in line:
+            current_interface = line.split()[0]
+            continue
+        if not current_interface or "access list is " not in line:
+            continue
+        _, found, acl = line.partition(INBOUND_MARKER)
+        if found:
+            yield current_interface, acl.strip(), "in"
+            continue
+        _, found, acl = line.partition(OUTBOUND_MARKER)
+        if found:
+            yield current_interface, acl.strip(), "out"
+
+
+def parse_acls(acl_raw, interface_raw):
+    """
+    แปลง raw config ของ ACL และ Interface ให้เป็นข้อมูลที่มีโครงสร้าง
+    ACL แบบ extended จะมี "type": "extended" เพิ่มมา
+    """
+    if not acl_raw or not interface_raw:
+        return []
+
+    acls = {}
+    for acl_type, name, rules in iter_acl_definitions(acl_raw):
+        acl = {"name": name, "rules": rules, "interfaces": []}
+        if acl_type == "extended":
+            acl["type"] = acl_type
+        acls[name] = acl
+
+    for interface, name, direction in iter_acl_bindings(interface_raw):
+        acl = acls.get(name)
+        if acl is not None:
+            acl["interfaces"].append(f"{interface} ({direction})")
+
+    return list(acls.values())
+
+
+def parse_snapshot(snapshot):
+    """parse ข้อมูลดิบใน snapshot ทั้งหมดครั้งเดียว (ผลลัพธ์เก็บไว้ในฟิลด์ 'parsed')"""
+    pools, excluded = parse_dhcp_pools(snapshot.get("dhcp_config_raw", ""))
+    return {
+        "parser_version": PARSER_VERSION,
+        "dhcp_pools": pools,
+        "dhcp_excluded": excluded,
+        "acls": parse_acls(
+            snapshot.get("acl_config_raw", ""),
+            snapshot.get("interface_detail_raw", ""),
+        ),
+    }
+
+
+def snapshot_parsed(snapshot):
+    """ผล parse ของ snapshot: ใช้ที่ worker เก็บไว้ถ้าเป็นเวอร์ชันปัจจุบัน ไม่งั้น parse ใหม่"""
+    if not snapshot:
+        return parse_snapshot({})
+    parsed = snapshot.get("parsed")
+    if parsed and parsed.get("parser_version") == PARSER_VERSION:
+        return parsed
+    return parse_snapshot(snapshot)
@@ -0,0 +1,46 @@
+import threading
+import time
+
+
+class LaneMetrics:
+    """เก็บเวลารอ (ตั้งแต่ส่งงานเข้าคิวจนเริ่มรัน) ของแต่ละ lane แล้วพิมพ์สรุปทุก interval วินาที"""
+
+    def __init__(self, interval=60.0):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._waits = {}
+        self._thread = None
+
+    def start(self):
+        if self._thread is None and self.interval > 0:
+            self._thread = threading.Thread(target=self._report_forever, daemon=True)
+            self._thread.start()
+
+    def record(self, lane, wait):
+        with self._lock:
+            self._waits.setdefault(lane, []).append(max(0.0, wait))
+
+    def snapshot(self):
+        """คืนสรุปของแต่ละ lane แล้วเริ่มนับรอบใหม่"""
+        with self._lock:
+            waits, self._waits = self._waits, {}
+        summary = {}
+        for lane, values in waits.items():
+            values.sort()
+            summary[lane] = {
+                "count": len(values),
+                "avg": sum(values) / len(values),
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+        return summary
+
+    def _report_forever(self):
+        while True:
+            time.sleep(self.interval)
+            for lane, stats in sorted(self.snapshot().items()):
+                print(
+                    f"[metrics] lane={lane} jobs={stats['count']} "
+                    f"wait avg={stats['avg']:.3f}s p95={stats['p95']:.3f}s "
+                    f"max={stats['max']:.3f}s"
+                )
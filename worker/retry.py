@@ -0,0 +1,73 @@
+import os
+import pika
+
+MAX_RETRIES = int(os.getenv("JOB_MAX_RETRIES", "3"))
+BASE_DELAY = float(os.getenv("JOB_RETRY_BASE_DELAY", "5"))
+# งาน polling ไม่ต้อง retry เพราะรอบถัดไปของ scheduler จะส่งมาใหม่อยู่แล้ว
+NO_RETRY_JOBS = {"check_interface", "check_interface_batch"}
+
+
+def retry_queue_name(queue, attempt):
+    return f"{queue}.retry.{attempt}"
+
+
+def dead_letter_queue_name(queue):
+    return f"{queue}.dlq"
+
+
+def retry_delay(attempt):
+    """หน่วงเวลาแบบ exponential: 5s, 10s, 20s, ..."""
+    return BASE_DELAY * (2**attempt)
+
+
+def declare_queues(ch, queue):
+    """ประกาศ delay queue ของแต่ละรอบ retry และ dead-letter queue ของ queue หลัก"""
+    for attempt in range(MAX_RETRIES):
+        ch.queue_declare(
+            queue=retry_queue_name(queue, attempt),
+            durable=True,
+            arguments={
+                "x-message-ttl": int(retry_delay(attempt) * 1000),
+                # หมดเวลาแล้วให้ RabbitMQ ส่งกลับเข้า queue หลัก
+                "x-dead-letter-exchange": "",
+                "x-dead-letter-routing-key": queue,
+            },
+        )
+    ch.queue_declare(queue=dead_letter_queue_name(queue), durable=True)
+
+
+def get_attempt(props):
+    return int((props.headers or {}).get("x-retry-count", 0))
+
+
+def failure_action(job, attempt):
+    """ตัดสินว่างานที่ล้มเหลวจะ 'dropped', 'retrying' หรือ 'failed' (ส่งเข้า DLQ)"""
+    if job.get("job_type", "check_interface") in NO_RETRY_JOBS:
+        return "dropped"
+    if attempt < MAX_RETRIES:
+        return "retrying"
+    return "failed"
+
+
+def publish_retry(ch, queue, body, attempt, error):
+    ch.basic_publish(
+        exchange="",
+        routing_key=retry_queue_name(queue, attempt),
+        body=body,
+        properties=pika.BasicProperties(
+            delivery_mode=2,
+            headers={"x-retry-count": attempt + 1, "x-last-error": error[:500]},
+        ),
+    )
+
+
+def publish_dead_letter(ch, queue, body, attempt, error):
+    ch.basic_publish(
+        exchange="",
+        routing_key=dead_letter_queue_name(queue),
+        body=body,
+        properties=pika.BasicProperties(
+            delivery_mode=2,
+            headers={"x-retry-count": attempt, "x-last-error": error[:500]},
+        ),
+    )
@@ -2,6 +2,7 @@ import ansible_runner
 import os
 import json
 import ipaddress
+from config_diff import config_delta
 
 
 def get_interfaces(ip, username, password):
@@ -38,6 +39,53 @@ def get_interfaces(ip, username, password):
     raise Exception(f"Failed to get interface data from {ip}.")
 
 
+def get_interfaces_batch(routers, forks=10):
+    """รัน playbook.yml ครั้งเดียวกับหลายเราเตอร์ แล้วแยก structured_output กลับตาม host"""
+    private_data_dir = os.path.dirname(__file__)
+
+    # ใส่ credential เป็น host vars ของแต่ละเครื่อง (ห้ามใช้ extravars เพราะจะทับทุก host)
+    inventory = {
+        "all": {
+            "hosts": {
+                router["ip"]: {
+                    "router_user": router["user"],
+                    "router_pass": router["password"],
+                }
+                for router in routers
+            }
+        }
+    }
+
+    result = ansible_runner.run(
+        private_data_dir=private_data_dir,
+        playbook="playbooks/playbook.yml",
+        inventory=inventory,
+        forks=forks,
+        quiet=True,
+    )
+
+    outputs = {}
+    failures = {}
+    for event in result.events:
+        event_data = event.get("event_data", {})
+        host = event_data.get("host")
+        if event["event"] == "runner_on_ok":
+            facts = event_data["res"].get("ansible_facts", {})
+            if "structured_output" in facts:
+                outputs[host] = facts["structured_output"]
+        elif event["event"] in ("runner_on_failed", "runner_on_unreachable"):
+            failures[host] = event_data.get("res", {}).get("msg", event["event"])
+
+    for router in routers:
+        if router["ip"] not in outputs and router["ip"] not in failures:
+            failures[router["ip"]] = f"no output (status: {result.status})"
+
+    print(
+        f"Batch poll of {len(routers)} routers: {len(outputs)} ok, {len(failures)} failed"
+    )
+    return outputs, failures
+
+
 def backup_config(ip, username, password):
     """รัน Ansible Playbook เพื่อ backup config"""
     private_data_dir = os.path.dirname(__file__)
@@ -99,6 +147,40 @@ def restore_config(ip, username, password, config_content):
 # ^^^ จบฟังก์ชัน ^^^
 
 
+def restore_config_incremental(ip, username, password, config_content):
+    """ดึง running-config มาเทียบกับ backup แล้วส่งเฉพาะคำสั่งที่ต่างกัน (ถ้าล้มเหลวใช้ restore แบบเต็ม)"""
+    running = backup_config(ip, username, password)
+    commands = config_delta(running, config_content)
+    if not commands:
+        return "unchanged"
+    if any("\n" in command for command in commands):
+        # banner หลายบรรทัดส่งผ่าน ios_config ทีละบรรทัดไม่ได้
+        print(f" Delta for {ip} changes a banner, using configure replace")
+        return restore_config(ip, username, password, config_content)
+
+    private_data_dir = os.path.dirname(__file__)
+
+    inventory = {"all": {"hosts": {ip: None}}}
+
+    result = ansible_runner.run(
+        private_data_dir=private_data_dir,
+        playbook="playbooks/apply_lines_playbook.yml",
+        inventory=inventory,
+        extravars={
+            "router_user": username,
+            "router_pass": password,
+            "config_lines": commands,
+        },
+        quiet=True,
+    )
+
+    if result.status == "failed":
+        print(f" Incremental restore failed for {ip}, using configure replace")
+        return restore_config(ip, username, password, config_content)
+
+    return result.status
+
+
 def configure_interface(
     ip,
     username,
@@ -0,0 +1,305 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import paramiko
+
+# prompt ของ IOS เช่น "R1#", "R1>", "R1(config-if)#"
+PROMPT_RE = re.compile(r"^[\w.\-@/:]+(\([\w.\-]+\))?[>#]\s*$")
+ERROR_MARKERS = (
+    "% Invalid input",
+    "% Incomplete command",
+    "% Ambiguous command",
+    "% Unknown command",
+)
+
+
+class CommandError(Exception):
+    """คำสั่งถูกปฏิเสธโดยเราเตอร์ (เซสชันยังใช้งานต่อได้)"""
+
+
+def open_client(ip, username, password, port=22, timeout=15.0):
+    """เปิด SSH connection ใหม่ (paramiko) ไปยังเราเตอร์"""
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        ip,
+        port=port,
+        username=username,
+        password=password,
+        timeout=timeout,
+        banner_timeout=timeout,
+        auth_timeout=timeout,
+        look_for_keys=False,
+        allow_agent=False,
+    )
+    return client
+
+
+class RouterSession:
+    """เซสชัน SSH แบบ interactive shell ไปยังเราเตอร์ IOS หนึ่งเครื่อง"""
+
+    def __init__(self, ip, username, password, port=22, timeout=15.0):
+        self.ip = ip
+        self.username = username
+        self.password = password
+        self.port = port
+        self.timeout = timeout
+        self.client = None
+        self.shell = None
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+    def connect(self):
+        client = open_client(
+            self.ip, self.username, self.password, self.port, self.timeout
+        )
+        client.get_transport().set_keepalive(30)
+        self.client = client
+        self.shell = client.invoke_shell(width=511, height=1000)
+        self._read_until_prompt()
+        self.send_command("terminal length 0")
+        self.send_command("terminal width 511")
+        return self
+
+    def _read_until_prompt(self, timeout=None):
+        deadline = time.monotonic() + (timeout or self.timeout)
+        buffer = ""
+        while time.monotonic() < deadline:
+            if self.shell.recv_ready():
+                buffer += self.shell.recv(65535).decode("utf-8", errors="replace")
+                last_line = buffer.replace("\r", "").rsplit("\n", 1)[-1]
+                if PROMPT_RE.match(last_line):
+                    return buffer.replace("\r", "")
+                continue
+            if self.shell.closed:
+                break
+            time.sleep(0.02)
+        raise TimeoutError(f"Timed out waiting for prompt from {self.ip}")
+
+    def send_command(self, command, timeout=None):
+        """ส่งคำสั่งหนึ่งบรรทัดแล้วคืน output (ตัดบรรทัด echo และ prompt ออก)"""
+        self.last_used = time.monotonic()
+        self.shell.send(command + "\n")
+        output = self._read_until_prompt(timeout)
+        lines = output.split("\n")[1:-1]
+        text = "\n".join(lines).strip()
+        for marker in ERROR_MARKERS:
+            if marker in text:
+                raise CommandError(f"{self.ip}: '{command}' -> {text}")
+        return text
+
+    def open_transfer_client(self):
+        """connection แยกสำหรับโอนไฟล์ (SCP): IOS ไม่ยอมให้เปิด channel ที่สองบน connection ที่มี shell อยู่"""
+        return open_client(
+            self.ip, self.username, self.password, self.port, self.timeout
+        )
+
+    def send_config_set(self, lines, timeout=None):
+        """เข้า configure terminal ส่งคำสั่งทีละคำสั่ง แล้วออกด้วย end (คำสั่งหลายบรรทัด เช่น banner ถูกส่งทั้งก้อนแล้วรอ prompt ครั้งเดียว)"""
+        outputs = [self.send_command("configure terminal", timeout)]
+        try:
+            for line in lines:
+                outputs.append(self.send_command(line, timeout))
+        finally:
+            self.send_command("end", timeout)
+        return "\n".join(output for output in outputs if output)
+
+    def is_alive(self):
+        if not self.client or not self.shell or self.shell.closed:
+            return False
+        transport = self.client.get_transport()
+        if not transport or not transport.is_active():
+            return False
+        try:
+            self.shell.send("\n")
+            self._read_until_prompt(timeout=3.0)
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            if self.client:
+                self.client.close()
+        except Exception:
+            pass
+        self.client = None
+        self.shell = None
+
+
+class SessionPool:
+    """เก็บเซสชัน SSH ที่ login แล้วไว้ใช้ซ้ำ แยกตาม router ip/credential"""
+
+    def __init__(self, max_per_router=2, idle_timeout=300.0, check_after=30.0):
+        self.max_per_router = max_per_router
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self._cond = threading.Condition()
+        self._idle = {}
+        self._in_use = {}
+        self._reaper = None
+        # เซสชันที่ถูกจองไว้ให้ thread ปัจจุบัน (ดู pinned)
+        self._local = threading.local()
+
+    @staticmethod
+    def _key(ip, username, password):
+        return (ip, username, password)
+
+    def _total(self, key):
+        return self._in_use.get(key, 0) + len(self._idle.get(key, []))
+
+    def acquire(self, ip, username, password, timeout=60.0):
+        key = self._key(ip, username, password)
+        deadline = time.monotonic() + timeout
+        self._start_reaper()
+        with self._cond:
+            while True:
+                idle = self._idle.get(key)
+                if idle:
+                    session = idle.pop()
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                if self._total(key) < self.max_per_router:
+                    session = None
+                    self._in_use[key] = self._in_use.get(key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No free SSH session for {ip}")
+                self._cond.wait(remaining)
+
+        # เชื่อมต่อ/ตรวจสอบนอก lock เพื่อไม่ให้ router อื่นต้องรอ
+        try:
+            if session and time.monotonic() - session.last_used > self.check_after:
+                if not session.is_alive():
+                    print(f"Pooled SSH session to {ip} is dead, reconnecting")
+                    session.close()
+                    session = None
+            if session is None:
+                session = RouterSession(ip, username, password).connect()
+        except Exception:
+            self._forget(key)
+            raise
+        return session
+
+    def release(self, session):
+        key = self._key(session.ip, session.username, session.password)
+        session.last_used = time.monotonic()
+        with self._cond:
+            self._in_use[key] -= 1
+            self._idle.setdefault(key, []).append(session)
+            self._cond.notify_all()
+
+    def discard(self, session):
+        session.close()
+        self._forget(self._key(session.ip, session.username, session.password))
+
+    def _forget(self, key):
+        with self._cond:
+            self._in_use[key] -= 1
+            self._cond.notify_all()
+
+    def _pins(self):
+        if not hasattr(self._local, "pins"):
+            self._local.pins = {}
+        return self._local.pins
+
+    @contextmanager
+    def pinned(self, ip, username, password):
+        """ภายใน block นี้ session() ของ router เดียวกันใน thread นี้จะได้เซสชันเดิมตลอด (ใช้กับงานที่รวมกลุ่มกัน)"""
+        key = self._key(ip, username, password)
+        pins = self._pins()
+        if key in pins:
+            yield
+            return
+        # เปิดเซสชันจริงตอน session() ครั้งแรก (งานที่ใช้ Ansible จะไม่เปิดเลย)
+        pins[key] = None
+        try:
+            yield
+        finally:
+            session = pins.pop(key, None)
+            if session is not None:
+                self.release(session)
+
+    @contextmanager
+    def session(self, ip, username, password):
+        key = self._key(ip, username, password)
+        pins = self._pins()
+        if key in pins:
+            session = pins[key] or self.acquire(ip, username, password)
+            pins[key] = session
+            try:
+                yield session
+            except CommandError:
+                raise
+            except Exception:
+                pins[key] = None
+                self.discard(session)
+                raise
+            return
+
+        session = self.acquire(ip, username, password)
+        try:
+            yield session
+        except CommandError:
+            self.release(session)
+            raise
+        except Exception:
+            # ปัญหาระดับ transport -> ทิ้งเซสชันนี้ไป
+            self.discard(session)
+            raise
+        else:
+            self.release(session)
+
+    def evict_idle(self):
+        now = time.monotonic()
+        expired = []
+        with self._cond:
+            for key, sessions in list(self._idle.items()):
+                keep = []
+                for session in sessions:
+                    if now - session.last_used > self.idle_timeout:
+                        expired.append(session)
+                    else:
+                        keep.append(session)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            self._cond.notify_all()
+        for session in expired:
+            session.close()
+        return len(expired)
+
+    def close_all(self):
+        with self._cond:
+            sessions = [s for idle in self._idle.values() for s in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._cond:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, daemon=True)
+            self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(1.0, self.idle_timeout / 2))
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"SSH pool: evicted {evicted} idle session(s)")
+
+
+pool = SessionPool(
+    max_per_router=int(os.getenv("SSH_POOL_MAX_PER_ROUTER", "2")),
+    idle_timeout=float(os.getenv("SSH_POOL_IDLE_TIMEOUT", "300")),
+    check_after=float(os.getenv("SSH_POOL_CHECK_AFTER", "30")),
+)
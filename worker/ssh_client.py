@@ -0,0 +1,238 @@
+import io
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+
+from ntc_templates.parse import parse_output
+from scp import SCPClient
+
+from config_diff import config_delta
+from session_pool import pool
+
+# งานที่ backend นี้รองรับ (งานอื่นจะใช้ Ansible ตามเดิม)
+SUPPORTED_JOBS = frozenset(
+    {
+        "check_interface",
+        "check_interface_batch",
+        "backup",
+        "restore",
+        "configure_interface",
+        "configure_dns",
+        "delete_dns",
+        "configure_dhcp",
+        "delete_dhcp_pool",
+        "save_config",
+        "configure_acl",
+        "delete_acl",
+    }
+)
+
+REMOTE_TEMP_FILENAME = "ansible_restore_temp.cfg"
+
+
+def get_interfaces(ip, username, password):
+    """เก็บข้อมูลแบบเดียวกับ playbooks/playbook.yml แต่รันคำสั่งตรงผ่าน SSH ไม่ผ่าน Ansible"""
+    with pool.session(ip, username, password) as session:
+        interfaces_raw = session.send_command("show ip interface brief")
+        dns_raw = session.send_command("show running-config | include ip name-server")
+        dhcp_raw = session.send_command("show run | section dhcp")
+        acl_raw = session.send_command("show ip access-lists")
+        interface_detail_raw = session.send_command("show ip interface", timeout=60)
+
+    dns_servers = []
+    for line in dns_raw.splitlines():
+        dns_servers += line.split(" ")[2:]
+
+    # ใช้ ntc-templates ตัวเดียวกับ ansible.netcommon.ntc_templates เพื่อให้ผลลัพธ์เหมือนกัน
+    return {
+        "interfaces": parse_output(
+            platform="cisco_ios", command="show ip interface brief", data=interfaces_raw
+        ),
+        "dns_servers": dns_servers,
+        "dhcp_config_raw": dhcp_raw,
+        "acl_config_raw": acl_raw,
+        "interface_detail_raw": interface_detail_raw,
+    }
+
+
+def get_interfaces_batch(routers, forks=10):
+    """poll หลายเราเตอร์พร้อมกันด้วย thread (forks = จำนวน thread)"""
+
+    def collect(router):
+        return get_interfaces(router["ip"], router["user"], router["password"])
+
+    outputs = {}
+    failures = {}
+    with ThreadPoolExecutor(max_workers=max(1, forks)) as executor:
+        futures = {router["ip"]: executor.submit(collect, router) for router in routers}
+        for router_ip, future in futures.items():
+            try:
+                outputs[router_ip] = future.result()
+            except Exception as e:
+                failures[router_ip] = f"{type(e).__name__}: {e}"
+
+    print(
+        f"Batch poll of {len(routers)} routers: {len(outputs)} ok, {len(failures)} failed"
+    )
+    return outputs, failures
+
+
+def backup_config(ip, username, password):
+    """ดึง running-config ผ่านเซสชัน SSH ใน pool"""
+    with pool.session(ip, username, password) as session:
+        return session.send_command("show running-config", timeout=60)
+
+
+def restore_config(ip, username, password, config_content):
+    """อัปโหลด config ขึ้น flash แล้วใช้ 'configure replace' (ขั้นตอนเดียวกับ restore_playbook)"""
+    with pool.session(ip, username, password) as session:
+        scp_check = session.send_command(
+            "show running-config | include ip scp server enable"
+        )
+        if "ip scp server enable" not in scp_check:
+            session.send_config_set(["ip scp server enable"])
+
+        # อัปโหลดผ่าน connection ของตัวเอง เซสชันใน pool ใช้ส่งคำสั่ง configure replace ต่อ
+        transfer = session.open_transfer_client()
+        try:
+            with SCPClient(transfer.get_transport()) as scp:
+                scp.putfo(
+                    io.BytesIO(config_content.encode("utf-8")),
+                    f"flash:/{REMOTE_TEMP_FILENAME}",
+                )
+        finally:
+            transfer.close()
+
+        session.send_command(
+            f"configure replace flash:/{REMOTE_TEMP_FILENAME} force", timeout=180
+        )
+        session.send_command(f"delete /force flash:/{REMOTE_TEMP_FILENAME}")
+    return "successful"
+
+
+def restore_config_incremental(ip, username, password, config_content):
+    """ส่งเฉพาะส่วนต่างระหว่าง running-config กับ backup ถ้าเราเตอร์ปฏิเสธคำสั่งจะกลับไปใช้ configure replace"""
+    try:
+        with pool.session(ip, username, password) as session:
+            running = session.send_command("show running-config", timeout=60)
+            commands = config_delta(running, config_content)
+            if not commands:
+                return "unchanged"
+            session.send_config_set(commands)
+            return "successful"
+    except Exception as e:
+        # ทุกกรณี (คำสั่งถูกปฏิเสธ, timeout ค้างกลางคำสั่ง) อาจมีส่วนต่างถูกใช้ไปบางส่วน replace ทั้งหมดให้ตรง backup
+        # (เซสชันที่ error ระดับ transport ถูก pool ทิ้งไปแล้ว ไม่ค้างอยู่ใน mode แปลก ๆ)
+        print(
+            f" Incremental restore on {ip} failed ({type(e).__name__}: {e}), using configure replace"
+        )
+    return restore_config(ip, username, password, config_content)
+
+
+def configure_interface(
+    ip,
+    username,
+    password,
+    interface_name,
+    config_type,
+    ip_address=None,
+    subnet_prefix=None,
+):
+    lines = [f"interface {interface_name}"]
+    if config_type == "dhcp":
+        lines.append("ip address dhcp")
+    elif config_type == "manual":
+        network = ipaddress.IPv4Network(f"0.0.0.0/{subnet_prefix}")
+        lines.append(f"ip address {ip_address} {network.netmask}")
+    elif config_type == "unassigned":
+        lines.append("no ip address")
+    lines.append("no shutdown")
+
+    with pool.session(ip, username, password) as session:
+        session.send_config_set(lines)
+    return "successful"
+
+
+def configure_dns(ip, username, password, dns_servers):
+    valid_dns_servers = [server for server in dns_servers if server]
+    if not valid_dns_servers:
+        print("No valid DNS servers provided. Skipping.")
+        return "skipped"
+
+    with pool.session(ip, username, password) as session:
+        session.send_config_set(
+            [f"ip name-server {server}" for server in valid_dns_servers]
+        )
+    return "successful"
+
+
+def configure_dhcp(
+    ip,
+    username,
+    password,
+    pool_name,
+    network_address,
+    subnet_prefix,
+    default_gateway,
+    exclude_start_ip,
+    exclude_end_ip,
+    dns_servers,
+):
+    network_obj = ipaddress.IPv4Network(
+        f"{network_address}/{subnet_prefix}", strict=False
+    )
+    valid_dns_servers = [server for server in dns_servers if server]
+
+    lines = []
+    if exclude_start_ip:
+        lines.append(f"ip dhcp excluded-address {exclude_start_ip} {exclude_end_ip}")
+    lines += [
+        f"ip dhcp pool {pool_name}",
+        f"network {network_address} {network_obj.netmask}",
+        f"default-router {default_gateway}",
+    ]
+    if valid_dns_servers:
+        lines.append(f"dns-server {' '.join(valid_dns_servers)}")
+
+    with pool.session(ip, username, password) as session:
+        session.send_config_set(lines)
+    return "successful"
+
+
+def delete_dhcp_pool(ip, username, password, pool_name):
+    with pool.session(ip, username, password) as session:
+        session.send_config_set([f"no ip dhcp pool {pool_name}"])
+    return "successful"
+
+
+def delete_dns(ip, username, password, dns_server):
+    with pool.session(ip, username, password) as session:
+        session.send_config_set([f"no ip name-server {dns_server}"])
+    return "successful"
+
+
+def save_config(ip, username, password):
+    with pool.session(ip, username, password) as session:
+        session.send_command("write memory", timeout=60)
+    return "successful"
+
+
+def configure_acl(ip, username, password, acl_number, rules, interface_name, direction):
+    lines = [f"ip access-list standard {acl_number}"]
+    lines += [
+        f"{rule['action']} {rule['source_ip']} {rule['wildcard']}" for rule in rules
+    ]
+    lines += [
+        "exit",
+        f"interface {interface_name}",
+        f"ip access-group {acl_number} {direction}",
+    ]
+
+    with pool.session(ip, username, password) as session:
+        session.send_config_set(lines)
+    return "successful"
+
+
+def delete_acl(ip, username, password, acl_number):
+    with pool.session(ip, username, password) as session:
+        session.send_config_set([f"no ip access-list standard {acl_number}"])
+    return "successful"